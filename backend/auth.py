@@ -1,10 +1,16 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Dict, Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from cache import principal_cache
 from database import get_db, User
 import os
 from dotenv import load_dotenv
@@ -15,7 +21,14 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt work factor; each step doubles the cost. Stored hashes with a
+# different cost are rehashed at the user's next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Threads hashing at once, and hashes queued or running before new requests wait
+BCRYPT_THREADS = int(os.getenv("BCRYPT_THREADS", str(min(4, os.cpu_count() or 1))))
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", str(BCRYPT_THREADS * 8)))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 security = HTTPBearer()
 
 def verify_password(plain_password, hashed_password):
@@ -24,6 +37,90 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+class PasswordHasher:
+    """Runs bcrypt on its own bounded thread pool.
+
+    bcrypt holds a thread for the whole hash, so sharing the default pool
+    lets a burst of logins starve every other blocking call. Here at most
+    max_pending hashes are queued or running; later callers wait on a
+    semaphore without taking a thread.
+    """
+
+    def __init__(self, threads: int = BCRYPT_THREADS, max_pending: int = BCRYPT_MAX_PENDING):
+        self.threads = threads
+        self.max_pending = max_pending
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def _run(self, fn, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="bcrypt")
+            self._slots = asyncio.Semaphore(self.max_pending)
+        
+        queued_at = time.monotonic()
+        call = {"started": False, "abandoned": False}
+        with self._lock:
+            self.queued += 1
+        
+        def timed():
+            with self._lock:
+                if call["abandoned"]:
+                    return None
+                # Wait covers both the semaphore and the executor's own queue
+                wait = time.monotonic() - queued_at
+                call["started"] = True
+                self.queued -= 1
+                self.in_flight += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+                    self.completed += 1
+        
+        try:
+            async with self._slots:
+                return await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+        finally:
+            # A request cancelled before a thread picked it up never runs
+            with self._lock:
+                if not call["started"]:
+                    call["abandoned"] = True
+                    self.queued -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, password, hashed_password)
+
+    def stop(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "threads": self.threads,
+            "rounds": BCRYPT_ROUNDS,
+            "max_pending": self.max_pending,
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "avg_wait_ms": self.total_wait / self.completed * 1000 if self.completed else 0.0,
+            "max_wait_ms": self.max_wait * 1000
+        }
+
+password_hasher = PasswordHasher()
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -34,43 +131,78 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_user_by_email(db: Session, email: str):
-    return db.query(User).filter(User.email == email).first()
+async def get_user_by_id(db: AsyncSession, user_id: int):
+    return await db.get(User, user_id)
 
-def create_user(db: Session, email: str, password: str):
-    hashed_password = get_password_hash(password)
+async def get_user_by_email(db: AsyncSession, email: str):
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalars().first()
+
+async def create_user(db: AsyncSession, email: str, password: str):
+    # bcrypt is deliberately slow; keep it off the event loop
+    hashed_password = await password_hasher.hash(password)
     db_user = User(email=email, hashed_password=hashed_password)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = get_user_by_email(db, email)
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+    user = await get_user_by_email(db, email)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    if not await password_hasher.verify(password, user.hashed_password):
         return False
+    if pwd_context.needs_update(user.hashed_password):
+        # Stored with an older policy (e.g. a lower BCRYPT_ROUNDS); the password
+        # is known to be right, so store it under the current one
+        user.hashed_password = await password_hasher.hash(password)
+        await db.commit()
+        await db.refresh(user)
     return user
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    token = credentials.credentials
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
     
-    user = get_user_by_email(db, email=email)
-    if user is None:
+    # The signature and expiry are checked above on every request; only the user lookup is cached
+    user = principal_cache.get(token)
+    if user is not None:
+        return user
+    
+    user_id = payload.get("uid")
+    generation = principal_cache.generation(user_id) if user_id is not None else 0
+    if user_id is not None:
+        user = await get_user_by_id(db, user_id)
+    else:
+        # Tokens issued before the uid claim
+        user = await get_user_by_email(db, email=email)
+        if user is not None:
+            generation = principal_cache.generation(user.id)
+    if user is None or user.email != email:
         raise credentials_exception
-    return user
\ No newline at end of file
+    
+    # Detach it so the cached user isn't tied to this request's session
+    db.expunge(user)
+    principal_cache.set(token, user, payload.get("exp", 0), generation)
+    return user
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def invalidate_principal(mapper, connection, user):
+    """Tokens cached for a user stop matching once the user changes"""
+    principal_cache.invalidate_user(user.id)
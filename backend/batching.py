@@ -0,0 +1,114 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-item requests into batched calls.
+
+    Items submitted within ``window_ms`` of the first waiting item, up to
+    ``max_batch_size``, are handed to ``batch_fn`` together; each caller gets
+    back the result at its own position. If a batch fails, its items are
+    re-run one at a time so only the callers whose items fail get the error.
+    Batch sizes and queue delay (time from submit until the batch is
+    dispatched) are tracked for tuning.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Any]], Awaitable[List[Any]]],
+                 max_batch_size: int = 32, window_ms: float = 5.0):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.window_ms = window_ms
+        self._pending: List[Tuple[Any, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Batches in flight; referenced here so they aren't garbage-collected mid-call
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.batches = 0
+        self.items = 0
+        self.max_batch_seen = 0
+        self.total_delay = 0.0
+        self.max_delay = 0.0
+        self.split_batches = 0
+
+    async def submit(self, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future, time.monotonic()))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_ms / 1000, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._pending:
+            batch = self._pending[:self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size:]
+            self._record(batch)
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def drain(self) -> None:
+        """Dispatch waiting items and wait for every batch in flight"""
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _record(self, batch: List[Tuple[Any, asyncio.Future, float]]) -> None:
+        now = time.monotonic()
+        oldest = now - min(submitted for _, _, submitted in batch)
+        self.batches += 1
+        self.items += len(batch)
+        self.max_batch_seen = max(self.max_batch_seen, len(batch))
+        self.total_delay += sum(now - submitted for _, _, submitted in batch)
+        self.max_delay = max(self.max_delay, oldest)
+
+    async def _call(self, items: List[Any]) -> List[Any]:
+        results = await self.batch_fn(items)
+        if len(results) != len(items):
+            raise RuntimeError(f"Batch function returned {len(results)} results for {len(items)} items")
+        return results
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future, float]]) -> None:
+        try:
+            results = await self._call([item for item, _, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                results = [e]
+            else:
+                # One bad item (say, an input the provider rejects) mustn't fail its batch-mates
+                self.split_batches += 1
+                results = await asyncio.gather(
+                    *(self._call([item]) for item, _, _ in batch), return_exceptions=True
+                )
+                results = [result if isinstance(result, BaseException) else result[0] for result in results]
+
+        for (_, future, _), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window_ms": self.window_ms,
+            "max_batch_size": self.max_batch_size,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "max_batch_seen": self.max_batch_seen,
+            "avg_queue_delay_ms": self.total_delay / self.items * 1000 if self.items else 0.0,
+            "max_queue_delay_ms": self.max_delay * 1000,
+            "split_batches": self.split_batches,
+            "in_flight": len(self._tasks)
+        }
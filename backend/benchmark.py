@@ -0,0 +1,297 @@
+"""Microbenchmarks for the CPU-bound parts of ingestion and search.
+
+Usage: python benchmark.py [chunking] [parsing] [search] [--repeat N]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from typing import Callable, List, Tuple
+
+from bs4 import BeautifulSoup
+
+from chunking import (
+    CHARS_PER_TOKEN, CHUNK_OVERLAP_TOKENS, CHUNK_TOKENS, chunk_spans, estimate_span_tokens, get_token_counter,
+    sentence_spans
+)
+from extraction import HTML_PARSER, clean_text, parse_article
+from keyword_index import KeywordIndex, SearchResult, fuse_results
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "pages")
+
+WORDS = (
+    "the of and to in is that for it as was with be by on not he this are or his from at which "
+    "but have an they you were her she there been one all we their has would when if so no will "
+    "research model article data system language learning network results method"
+).split()
+
+
+def make_document(words: int, seed: int = 0) -> str:
+    """Synthetic book-length text with sentences and paragraph breaks"""
+    rng = random.Random(seed)
+    parts = []
+    sentence = 0
+    for i in range(words):
+        word = rng.choice(WORDS)
+        parts.append(word.capitalize() if sentence == 0 else word)
+        sentence += 1
+        if sentence > 8 and rng.random() < 0.12:
+            parts[-1] += rng.choice(".!?") if rng.random() < 0.2 else "."
+            parts.append("\n\n" if rng.random() < 0.1 else " ")
+            sentence = 0
+        else:
+            parts.append(" ")
+    return "".join(parts)
+
+
+def legacy_chunk_text(text: str, chunk_size: int = 800, overlap: int = 150) -> List[str]:
+    """The character-based chunker EmbeddingService used before chunking.py"""
+    if len(text) <= chunk_size:
+        return [text]
+
+    chunks = []
+    start = 0
+
+    while start < len(text):
+        end = start + chunk_size
+        if end < len(text):
+            for punct in ['. ', '! ', '? ', '\n\n']:
+                last_punct = text.rfind(punct, start + chunk_size - 200, end)
+                if last_punct != -1:
+                    end = last_punct + len(punct)
+                    break
+
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+
+        start = max(start + chunk_size - overlap, end - overlap)
+
+        if start >= len(text):
+            break
+
+    return chunks if chunks else [text]
+
+
+def legacy_parse_article(html: bytes) -> Tuple[str, str]:
+    """The extraction scraper.py used before the single-pass engine:
+    html.parser, a find_all walk per unwanted tag and class/id pattern, and a
+    select_one walk per title/content selector."""
+    soup = BeautifulSoup(html, 'html.parser')
+
+    for tag in ['script', 'style', 'nav', 'header', 'footer', 'aside',
+                'advertisement', 'ads', 'sidebar', 'menu', 'social',
+                'comment', 'comments', 'popup', 'modal', 'overlay',
+                'cookie', 'newsletter', 'subscription']:
+        for element in soup.find_all(tag):
+            element.decompose()
+    for pattern in ['nav', 'menu', 'sidebar', 'footer', 'header', 'ad', 'advertisement',
+                    'social', 'share', 'comment', 'popup', 'modal', 'cookie',
+                    'newsletter', 'subscription', 'related', 'recommended']:
+        for element in soup.find_all(attrs={'class': re.compile(pattern, re.I)}):
+            element.decompose()
+        for element in soup.find_all(attrs={'id': re.compile(pattern, re.I)}):
+            element.decompose()
+
+    title = "Untitled"
+    for selector in ['h1.title', 'h1.post-title', 'h1.entry-title', 'h1.article-title',
+                     '.title h1', 'article h1', 'h1', 'title']:
+        element = soup.select_one(selector)
+        if element:
+            text = element.get_text().strip()
+            if text and len(text) > 5:
+                title = clean_text(text)
+                break
+
+    for selector in ['article .content', 'article .post-content', 'article .entry-content',
+                     'article .article-content', 'article .article-body', '.post-content',
+                     '.entry-content', '.article-content', '.article-body', '.content',
+                     'article', '[role="main"]', 'main .content', 'main', '.main-content',
+                     '#content', '#main-content']:
+        content_element = soup.select_one(selector)
+        if content_element:
+            paragraphs = content_element.find_all('p')
+            if paragraphs:
+                content = ' '.join([p.get_text().strip() for p in paragraphs if p.get_text().strip()])
+            else:
+                content = content_element.get_text(separator=' ', strip=True)
+            content = clean_text(content)
+            if len(content) > 200 and len(content.split()) > 50:
+                return title, content
+
+    body = soup.find('body')
+    if body:
+        for nav in body.find_all(['nav', 'header', 'footer', 'aside']):
+            nav.decompose()
+        return title, clean_text(body.get_text(separator=' ', strip=True))
+    return title, ""
+
+
+def load_fixtures() -> List[Tuple[str, bytes]]:
+    pages = []
+    for name in sorted(os.listdir(FIXTURES)):
+        with open(os.path.join(FIXTURES, name), "rb") as f:
+            pages.append((name, f.read()))
+    return pages
+
+
+def make_large_page(html: bytes, copies: int) -> bytes:
+    """Blow a fixture up to a multi-megabyte page by repeating its body"""
+    head, _, rest = html.partition(b"<body")
+    body, _, tail = rest.partition(b"</body>")
+    inner = body[body.index(b">") + 1:]
+    return head + b"<body>" + inner * copies + b"</body>" + tail
+
+
+def timeit(fn: Callable[[], object], repeat: int) -> float:
+    """Best wall time of ``repeat`` runs, in milliseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def report(name: str, ms: float, count: int, unit: str) -> None:
+    print(f"  {name:<32} {ms:9.2f} ms  {count:6d} {unit}")
+
+
+def bench_chunking(repeat: int) -> None:
+    strategies = [
+        # Same window and overlap as the spans, in characters
+        ("legacy (chars, copies)", lambda text: legacy_chunk_text(
+            text, CHUNK_TOKENS * CHARS_PER_TOKEN, CHUNK_OVERLAP_TOKENS * CHARS_PER_TOKEN
+        )),
+        ("sentence split (one pass)", sentence_spans),
+        ("spans (estimated tokens)", lambda text: chunk_spans(text, count_tokens=estimate_span_tokens)),
+        ("spans, sliced to strings", lambda text: [text[start:end] for start, end in chunk_spans(text)]),
+    ]
+    try:
+        counter = get_token_counter()
+        strategies += [
+            ("spans (tiktoken)", lambda text: chunk_spans(text, count_tokens=counter)),
+            # The floor for any exact-token chunker: encoding the text once
+            ("tiktoken, whole text", lambda text: [counter(text, 0, len(text))]),
+        ]
+    except Exception as e:
+        print(f"  (no tokenizer: {e}; skipping exact-token strategies)")
+
+    for words in (2000, 100000, 500000):
+        text = make_document(words)
+        print(f"chunking: {words} words, {len(text)} characters")
+        for name, strategy in strategies:
+            chunks = strategy(text)
+            report(name, timeit(lambda: strategy(text), repeat), len(chunks), "chunks")
+
+
+def bench_parsing(repeat: int) -> bool:
+    """Per-page parse time before and after, and whether the outputs agree"""
+    pages = load_fixtures()
+    pages += [(f"{name} x200", make_large_page(html, 200)) for name, html in pages[:2]]
+
+    print(f"parsing: legacy (html.parser) vs single pass ({HTML_PARSER})")
+    equivalent = True
+    for name, html in pages:
+        before = legacy_parse_article(html)
+        after = parse_article(html)
+        same = before == after
+        equivalent &= same
+        legacy_ms = timeit(lambda: legacy_parse_article(html), repeat)
+        new_ms = timeit(lambda: parse_article(html), repeat)
+        print(f"  {name:<20} {len(html):9d} B  {legacy_ms:9.2f} ms -> {new_ms:8.2f} ms  "
+              f"({legacy_ms / new_ms:4.1f}x)  {'same output' if same else 'OUTPUT DIFFERS'}")
+    return equivalent
+
+
+def make_search_corpus(articles: int) -> List[str]:
+    """Articles that each mention one error code only they contain"""
+    docs = []
+    for i in range(articles):
+        text = make_document(1500, seed=i)
+        middle = len(text) // 2
+        docs.append(f"{text[:middle]} The job failed with ERR{i:05d} again. {text[middle:]}")
+    return docs
+
+
+def vector_search(collection, embedding: List[float], limit: int) -> List[SearchResult]:
+    """Best chunk per article, as EmbeddingService.search_similar_articles ranks them"""
+    results = collection.query(query_embeddings=[embedding], n_results=limit * 3,
+                               include=["documents", "metadatas", "distances"])
+    best: List[SearchResult] = []
+    for doc, meta, distance in zip(results["documents"][0], results["metadatas"][0], results["distances"][0]):
+        if meta["article_id"] not in {article_id for article_id, _, _ in best}:
+            best.append((meta["article_id"], 1 - distance, doc))
+    return best[:limit]
+
+
+def bench_search(repeat: int, articles: int = 200, queries: int = 50, limit: int = 5) -> None:
+    """Recall@limit and per-query latency on exact-term queries for keyword,
+    vector and hybrid search. The vector paths need a working embedding
+    provider (OPENAI_API_KEY, or EMBEDDING_PROVIDER=local)."""
+    docs = make_search_corpus(articles)
+    chunks = [(f"article_{i}_chunk_{j}", i, 1, start, end, f"Article {i}", doc[start:end])
+              for i, doc in enumerate(docs) for j, (start, end) in enumerate(chunk_spans(doc))]
+    questions = [(f"what does ERR{i:05d} mean for the model", i)
+                 for i in random.Random(0).sample(range(articles), queries)]
+
+    index = KeywordIndex(":memory:")
+    index.open()
+    index.add_chunks(chunks)
+
+    def keyword_search(question: str) -> List[SearchResult]:
+        # Snippets are sliced from the article by offset, as the app does
+        return [(article_id, score, docs[article_id][start:end])
+                for article_id, score, start, end in index.search(question, 1, limit)]
+
+    searches = {"keyword": keyword_search}
+
+    try:
+        import chromadb
+        from embedding_providers import get_provider
+        provider = get_provider()
+        collection = chromadb.EphemeralClient().create_collection(
+            f"bench_{int(time.time())}", metadata={"hnsw:space": "cosine"})
+        for i in range(0, len(chunks), 256):
+            batch = chunks[i:i + 256]
+            collection.add(ids=[chunk[0] for chunk in batch],
+                           embeddings=provider.embed([chunk[-1] for chunk in batch]),
+                           documents=[chunk[-1] for chunk in batch],
+                           metadatas=[{"article_id": chunk[1]} for chunk in batch])
+        searches["vector"] = lambda question: vector_search(collection, provider.embed([question])[0], limit)
+        searches["hybrid"] = lambda question: fuse_results(
+            vector_search(collection, provider.embed([question])[0], limit),
+            keyword_search(question), limit)
+    except Exception as e:
+        print(f"  (no embedding provider: {e}; skipping vector and hybrid search)")
+
+    print(f"search: {articles} articles, {len(chunks)} chunks, {queries} exact-term queries")
+    for name, search in searches.items():
+        hits = sum(any(article_id == wanted for article_id, _, _ in search(question))
+                   for question, wanted in questions)
+        ms = timeit(lambda: [search(question) for question, _ in questions], repeat) / queries
+        print(f"  {name:<10} recall@{limit} {hits / queries:6.1%}  {ms:8.2f} ms/query")
+
+
+BENCHMARKS = {
+    "chunking": bench_chunking,
+    "parsing": bench_parsing,
+    "search": bench_search,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("names", nargs="*", help=f"any of: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark: {name}")
+
+    ok = True
+    for name in args.names or BENCHMARKS:
+        ok &= BENCHMARKS[name](args.repeat) is not False
+    sys.exit(0 if ok else 1)
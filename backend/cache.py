@@ -0,0 +1,501 @@
+import asyncio
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Answer cache; ANSWER_CACHE_SIMILARITY=0 keeps matching exact-question only
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0"))
+
+# Authenticated users per access token; entries never outlive their token
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "4096"))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "300"))
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with optional TTL and hit/miss counters"""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, Tuple[Optional[float], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Any) -> Optional[Any]:
+        with self._lock:
+            value = self._lookup(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def peek(self, key: Any) -> Optional[Any]:
+        """Like get, but without touching the hit/miss counters"""
+        with self._lock:
+            return self._lookup(key)
+
+    def contains(self, key: Any) -> bool:
+        """Whether ``key`` holds a live entry, without touching recency or counters"""
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and (entry[0] is None or entry[0] > time.monotonic())
+
+    def _lookup(self, key: Any) -> Optional[Any]:
+        if key in self._data:
+            expires_at, value = self._data[key]
+            if expires_at is None or expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                return value
+            del self._data[key]
+        return None
+
+    def set(self, key: Any, value: Any, ttl: Optional[float] = None) -> None:
+        if self.maxsize <= 0:
+            return
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Any) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace and case so trivially different queries share a key"""
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+
+class EmbeddingCache:
+    """Query-embedding cache keyed by model and normalized text.
+
+    Lookups go to an in-process LRU first, then to an optional SQLite file that
+    survives restarts. The disk tier is bounded to ``max_disk_entries`` rows;
+    the least recently used rows are evicted in blocks once it is full. Disk
+    hits don't write: their last_used times are batched and flushed with the
+    next insert or every TOUCH_BATCH hits. The async methods run the disk tier
+    in a worker thread. The file is only created by open(); until then the
+    cache is memory-only.
+    """
+
+    TOUCH_BATCH = 64
+
+    def __init__(self, maxsize: int = 1024, path: Optional[str] = None, max_disk_entries: int = 100000):
+        self.memory = LRUCache(maxsize)
+        self.path = path
+        self.max_disk_entries = max_disk_entries
+        self.disk_hits = 0
+        self.disk_misses = 0
+        self._disk: Optional[sqlite3.Connection] = None
+        self._disk_lock = threading.Lock()
+        self._disk_size = 0
+        self._touches: Dict[str, float] = {}
+
+    def open(self) -> None:
+        """Open the disk tier, if the cache has one"""
+        with self._disk_lock:
+            if self.path and self._disk is None:
+                disk = sqlite3.connect(self.path, check_same_thread=False)
+                disk.execute(
+                    "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                    "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+                )
+                disk.execute(
+                    "CREATE INDEX IF NOT EXISTS ix_query_embeddings_last_used ON query_embeddings (last_used)"
+                )
+                disk.commit()
+                self._disk_size = disk.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+                self._disk = disk
+
+    def close(self) -> None:
+        with self._disk_lock:
+            if self._disk is not None:
+                self._flush_touches()
+                self._disk.commit()
+                self._disk.close()
+                self._disk = None
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        key = self.make_key(model, text)
+        vector = self.memory.get(key)
+        if vector is not None or self._disk is None:
+            return vector
+        return self._disk_get(key)
+
+    async def aget(self, model: str, text: str) -> Optional[List[float]]:
+        key = self.make_key(model, text)
+        vector = self.memory.get(key)
+        if vector is not None or self._disk is None:
+            return vector
+        return await asyncio.to_thread(self._disk_get, key)
+
+    def _disk_get(self, key: str) -> Optional[List[float]]:
+        with self._disk_lock:
+            if self._disk is None:
+                return None  # closed meanwhile
+            row = self._disk.execute(
+                "SELECT vector FROM query_embeddings WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.disk_misses += 1
+                return None
+            self.disk_hits += 1
+            self._touches[key] = time.time()
+            if len(self._touches) >= self.TOUCH_BATCH:
+                self._flush_touches()
+                self._disk.commit()
+
+        vector = array("f", row[0]).tolist()
+        self.memory.set(key, vector)
+        return vector
+
+    def _flush_touches(self) -> None:
+        """Write batched last_used times; the caller holds the lock and commits"""
+        if self._touches:
+            self._disk.executemany(
+                "UPDATE query_embeddings SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touches.items()]
+            )
+            self._touches.clear()
+
+    def set(self, model: str, text: str, vector: List[float]) -> None:
+        key = self.make_key(model, text)
+        self.memory.set(key, vector)
+        if self._disk is not None:
+            self._disk_set(key, vector)
+
+    async def aset(self, model: str, text: str, vector: List[float]) -> None:
+        key = self.make_key(model, text)
+        self.memory.set(key, vector)
+        if self._disk is not None:
+            await asyncio.to_thread(self._disk_set, key, vector)
+
+    def _disk_set(self, key: str, vector: List[float]) -> None:
+        with self._disk_lock:
+            if self._disk is None:
+                return  # closed meanwhile
+            # Touches first, so eviction below sees current last_used times
+            self._flush_touches()
+            cursor = self._disk.execute(
+                "INSERT OR REPLACE INTO query_embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                (key, array("f", vector).tobytes(), time.time())
+            )
+            self._disk_size += cursor.rowcount
+            if self._disk_size > self.max_disk_entries:
+                # Evict a block at a time so eviction doesn't run on every insert
+                evict = self._disk_size - self.max_disk_entries + max(1, self.max_disk_entries // 10)
+                self._disk.execute(
+                    "DELETE FROM query_embeddings WHERE key IN "
+                    "(SELECT key FROM query_embeddings ORDER BY last_used LIMIT ?)", (evict,)
+                )
+                self._disk_size = self._disk.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+            self._disk.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {"memory": self.memory.stats()}
+        if self._disk is not None:
+            lookups = self.disk_hits + self.disk_misses
+            stats["disk"] = {
+                "size": self._disk_size,
+                "max_entries": self.max_disk_entries,
+                "hits": self.disk_hits,
+                "misses": self.disk_misses,
+                "hit_rate": self.disk_hits / lookups if lookups else 0.0
+            }
+        return stats
+
+
+class PageCache:
+    """Persistent cache of scraped pages for conditional re-fetching.
+
+    Stores the ETag/Last-Modified validators of a page together with its
+    parsed title and content, so a 304 response needs no download and no
+    parsing. Bounded to ``max_entries`` rows, evicted least recently fetched
+    first in blocks. The file is only created by open(), which the app calls
+    at startup.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self.not_modified = 0
+        self.modified = 0
+        self.uncached = 0
+        self._size = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._db is not None
+
+    def open(self) -> None:
+        with self._lock:
+            if self._db is None:
+                self._db = self._connect()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, final_url TEXT NOT NULL, "
+            "title TEXT NOT NULL, content TEXT NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS ix_pages_fetched_at ON pages (fetched_at)")
+        db.commit()
+        self._size = db.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+        return db
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified, final_url, title, content FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("etag", "last_modified", "url", "title", "content"), row))
+
+    def conditional_headers(self, entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        headers = {}
+        if entry and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def touch(self, url: str) -> None:
+        """Record a 304 for a cached page"""
+        with self._lock:
+            self.not_modified += 1
+            self._db.execute("UPDATE pages SET fetched_at = ? WHERE url = ?", (time.time(), url))
+            self._db.commit()
+
+    def set(self, url: str, etag: Optional[str], last_modified: Optional[str],
+            final_url: str, title: str, content: str, revalidated: bool = False) -> None:
+        with self._lock:
+            if revalidated:
+                self.modified += 1
+            else:
+                self.uncached += 1
+            if not etag and not last_modified:
+                # Nothing to revalidate with next time
+                cursor = self._db.execute("DELETE FROM pages WHERE url = ?", (url,))
+                self._size -= cursor.rowcount
+                self._db.commit()
+                return
+
+            exists = self._db.execute("SELECT 1 FROM pages WHERE url = ?", (url,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages (url, etag, last_modified, final_url, title, content, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, final_url, title, content, time.time())
+            )
+            if exists is None:
+                self._size += 1
+            if self._size > self.max_entries:
+                evict = self._size - self.max_entries + max(1, self.max_entries // 10)
+                self._db.execute(
+                    "DELETE FROM pages WHERE url IN (SELECT url FROM pages ORDER BY fetched_at LIMIT ?)", (evict,)
+                )
+                self._size = self._db.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+            self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        revalidations = self.not_modified + self.modified
+        return {
+            "size": self._size,
+            "max_entries": self.max_entries,
+            "not_modified": self.not_modified,
+            "modified": self.modified,
+            "uncached": self.uncached,
+            "revalidation_hit_rate": self.not_modified / revalidations if revalidations else 0.0
+        }
+
+
+def cosine_similarity(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class AnswerCache:
+    """Cache of /qa answers keyed by user, retrieved chunks and question.
+
+    Each user has a generation counter that is part of every key; bumping it
+    (invalidate_user) makes that user's entries unreachable, and the LRU/TTL
+    policy then ages them out. With a similarity threshold set, a question
+    that misses exactly can still match an earlier one over the same chunks
+    whose embedding is at least that similar.
+    """
+
+    MAX_SIMILAR_CANDIDATES = 32
+
+    def __init__(self, maxsize: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL,
+                 similarity_threshold: float = ANSWER_CACHE_SIMILARITY):
+        self.entries = LRUCache(maxsize, ttl)
+        self.similarity_threshold = similarity_threshold
+        self.similar_hits = 0
+        self._generations: Dict[int, int] = {}
+        # (user_id, generation, fingerprint) -> [(question_embedding, key)], least recently added first
+        self._candidates: "OrderedDict[Tuple[int, int, str], List[Tuple[List[float], Tuple]]]" = OrderedDict()
+        self._candidate_count = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(chunk_ids: Iterable[str]) -> str:
+        return hashlib.sha256("\0".join(sorted(chunk_ids)).encode("utf-8")).hexdigest()
+
+    def generation(self, user_id: int) -> int:
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            for scope in [scope for scope in self._candidates if scope[0] == user_id]:
+                self._candidate_count -= len(self._candidates.pop(scope))
+
+    def get(self, user_id: int, fingerprint: str, question: str,
+            question_embedding: Optional[List[float]] = None) -> Optional[dict]:
+        key = (user_id, self.generation(user_id), fingerprint, normalize_text(question))
+        answer = self.entries.get(key)
+        if answer is not None or not self.similarity_threshold or question_embedding is None:
+            return answer
+
+        with self._lock:
+            candidates = list(self._candidates.get(key[:3], []))
+        for embedding, candidate_key in candidates:
+            if cosine_similarity(question_embedding, embedding) >= self.similarity_threshold:
+                answer = self.entries.peek(candidate_key)
+                if answer is not None:
+                    self.similar_hits += 1
+                    return answer
+        return None
+
+    def set(self, user_id: int, generation: int, fingerprint: str, question: str, answer: dict,
+            question_embedding: Optional[List[float]] = None) -> None:
+        """Cache an answer; ``generation`` is the one read before its chunks were
+        retrieved, so an answer built from chunks the user has since changed is dropped"""
+        if generation != self.generation(user_id):
+            return
+        key = (user_id, generation, fingerprint, normalize_text(question))
+        self.entries.set(key, answer)
+        if not self.similarity_threshold or question_embedding is None:
+            return
+
+        with self._lock:
+            scope = key[:3]
+            previous = self._candidates.pop(scope, [])
+            candidates = [candidate for candidate in previous if self.entries.contains(candidate[1])]
+            candidates.append((question_embedding, key))
+            del candidates[:-self.MAX_SIMILAR_CANDIDATES]
+            self._candidates[scope] = candidates
+            self._candidate_count += len(candidates) - len(previous)
+            # The cache never holds more answers than maxsize, so scopes beyond
+            # that many candidates mostly point at evicted entries
+            while self._candidate_count > self.entries.maxsize and len(self._candidates) > 1:
+                _, dropped = self._candidates.popitem(last=False)
+                self._candidate_count -= len(dropped)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.entries.stats()
+        # Near-duplicate matches are counted as misses by the exact lookup
+        hits = stats["hits"] + self.similar_hits
+        lookups = stats["hits"] + stats["misses"]
+        stats.update({
+            "exact_hits": stats.pop("hits"),
+            "similar_hits": self.similar_hits,
+            "misses": stats["misses"] - self.similar_hits,
+            "hit_rate": hits / lookups if lookups else 0.0
+        })
+        return stats
+
+class PrincipalCache:
+    """Authenticated users keyed by access token, so most requests skip the user query.
+
+    An entry expires with its token or after ``ttl``, whichever comes first.
+    As in AnswerCache, invalidate_user bumps a per-user generation and
+    entries cached under an older generation no longer match.
+    """
+
+    def __init__(self, maxsize: int = PRINCIPAL_CACHE_SIZE, ttl: float = PRINCIPAL_CACHE_TTL):
+        self.entries = LRUCache(maxsize, ttl)
+        self._generations: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def generation(self, user_id: int) -> int:
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def get(self, token: str) -> Optional[Any]:
+        entry = self.entries.get(token)
+        if entry is None:
+            return None
+        generation, user = entry
+        if generation != self.generation(user.id):
+            self.entries.delete(token)
+            return None
+        return user
+
+    def set(self, token: str, user: Any, expires_at: float, generation: int) -> None:
+        """Cache ``user`` for ``token`` (expiring at epoch ``expires_at``); pass the
+        generation read before the user was loaded so a concurrent change wins"""
+        ttl = min(self.entries.ttl, expires_at - time.time())
+        if ttl > 0:
+            self.entries.set(token, (generation, user), ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.entries.stats()
+
+# Global instances
+answer_cache = AnswerCache()
+principal_cache = PrincipalCache()
@@ -0,0 +1,93 @@
+import sqlite3
+import threading
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class ChunkStore:
+    """Content-addressed chunk embeddings: chunk hash -> vector and reference count.
+
+    Entries are only ever looked up by hash, so they live in a plain SQLite
+    table rather than a vector collection (which would build and persist a
+    second ANN index nobody searches). ref_count is the number of article
+    chunks pointing at an entry; entries are deleted when it drops to zero.
+    The file is only created by open().
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+    def open(self) -> None:
+        with self._lock:
+            if self._db is None:
+                self._db = sqlite3.connect(self.path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS chunk_vectors ("
+                    "hash TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, ref_count INTEGER NOT NULL)"
+                )
+                self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _select(self, columns: str, hashes: List[str]) -> List[Tuple]:
+        rows = []
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(hashes), 500):
+            batch = hashes[i:i + 500]
+            rows += self._db.execute(
+                f"SELECT hash, {columns} FROM chunk_vectors WHERE hash IN ({','.join('?' * len(batch))})", batch
+            ).fetchall()
+        return rows
+
+    def get_vectors(self, hashes: List[str]) -> Dict[str, List[float]]:
+        """hash -> embedding for the hashes that are stored"""
+        with self._lock:
+            rows = self._select("vector", list(dict.fromkeys(hashes)))
+        return {h: array("f", vector).tolist() for h, vector in rows}
+
+    def acquire(self, model: str, vectors: Dict[str, List[float]], references: Counter) -> None:
+        """Add ``references[h]`` references to each entry, storing vectors for new hashes"""
+        with self._lock:
+            existing = {h for h, _ in self._select("ref_count", list(references))}
+            self._db.executemany(
+                "UPDATE chunk_vectors SET ref_count = ref_count + ? WHERE hash = ?",
+                [(count, h) for h, count in references.items() if h in existing]
+            )
+            self._db.executemany(
+                "INSERT INTO chunk_vectors (hash, model, vector, ref_count) VALUES (?, ?, ?, ?)",
+                [(h, model, array("f", vectors[h]).tobytes(), count)
+                 for h, count in references.items() if h not in existing]
+            )
+            self._db.commit()
+
+    def release(self, references: Counter) -> None:
+        """Drop references; entries nobody references any more are deleted"""
+        with self._lock:
+            self._db.executemany(
+                "UPDATE chunk_vectors SET ref_count = ref_count - ? WHERE hash = ?",
+                [(count, h) for h, count in references.items()]
+            )
+            self._db.executemany(
+                "DELETE FROM chunk_vectors WHERE hash = ? AND ref_count <= 0", [(h,) for h in references]
+            )
+            self._db.commit()
+
+    def import_entries(self, entries: Iterable[Tuple[str, str, List[float], int]]) -> None:
+        """Insert or replace (hash, model, vector, ref_count) rows"""
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO chunk_vectors (hash, model, vector, ref_count) VALUES (?, ?, ?, ?)",
+                [(h, model, array("f", vector).tobytes(), count) for h, model, vector, count in entries]
+            )
+            self._db.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM chunk_vectors").fetchone()[0]
@@ -0,0 +1,140 @@
+import os
+import re
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from typing import Callable, List, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Chunk budget in tokens of the embedding model (~800 characters of English)
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "200"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))
+# tiktoken encoding used to count tokens for OpenAI embedding models
+CHUNK_TOKENIZER = os.getenv("CHUNK_TOKENIZER", "cl100k_base")
+
+CHARS_PER_TOKEN = 4
+
+# A sentence: from a non-space character through terminal punctuation that is
+# followed by whitespace, or up to a blank line. Written so the regex engine
+# consumes each sentence in one match rather than testing every position.
+_SENTENCE = re.compile(r'\S[^.!?\n]*(?:(?:[.!?]+(?!\s)|\n(?!\s*\n))[^.!?\n]*)*[.!?]*')
+
+Span = Tuple[int, int]
+# (text, start, end) -> tokens in text[start:end]
+TokenCounter = Callable[[str, int, int], int]
+
+
+def estimate_span_tokens(text: str, start: int, end: int) -> int:
+    """Rough token count (~4 characters per token) without slicing the text.
+
+    For benchmarks and tests; the embedding service counts real tokens.
+    """
+    return (end - start + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def get_token_counter(encoding: str = CHUNK_TOKENIZER) -> TokenCounter:
+    """Exact token counts for OpenAI embedding models, with tiktoken"""
+    try:
+        import tiktoken
+    except ImportError:
+        raise RuntimeError("Chunking counts embedding-model tokens and requires tiktoken (pip install tiktoken)")
+    encoder = tiktoken.get_encoding(encoding)
+
+    def count(text: str, start: int, end: int) -> int:
+        return len(encoder.encode_ordinary(text[start:end]))
+    return count
+
+
+def _skip_space(text: str, i: int, end: int) -> int:
+    while i < end and text[i].isspace():
+        i += 1
+    return i
+
+
+def _trim_end(text: str, start: int, i: int) -> int:
+    while i > start and text[i - 1].isspace():
+        i -= 1
+    return i
+
+
+def sentence_spans(text: str) -> List[Span]:
+    """Offsets of the text's sentences, trimmed of whitespace, in one regex pass"""
+    spans: List[Span] = []
+    for match in _SENTENCE.finditer(text):
+        start, end = match.span()
+        if text[end - 1].isspace():
+            # Spaces before a blank line
+            end = _trim_end(text, start, end)
+        spans.append((start, end))
+    return spans
+
+
+def _split_sentence(text: str, start: int, end: int, max_tokens: int,
+                    count_tokens: TokenCounter) -> Tuple[List[Span], List[int]]:
+    """Cut a sentence longer than the budget into pieces at words, with their token counts"""
+    pieces: List[Span] = []
+    counts: List[int] = []
+    # Pieces are cut from a window this wide, so the rest of a long sentence
+    # isn't re-counted after every cut
+    window = max_tokens * CHARS_PER_TOKEN * 2
+    while start < end:
+        cut = end if end - start <= window else start + window
+        if cut < end:
+            space = text.rfind(' ', start + 1, cut + 1)
+            cut = _trim_end(text, start, space) if space != -1 else cut
+        count = count_tokens(text, start, cut)
+        while count > max_tokens:
+            # Shrink in proportion to the overshoot, ending on a word where there is one
+            target = start + max(1, (cut - start) * max_tokens // count)
+            space = text.rfind(' ', start + 1, target + 1)
+            cut = _trim_end(text, start, space) if space != -1 else target
+            count = count_tokens(text, start, cut)
+        pieces.append((start, cut))
+        counts.append(count)
+        start = _skip_space(text, cut, end)
+    return pieces, counts
+
+
+def chunk_spans(text: str, max_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                count_tokens: Optional[TokenCounter] = None) -> List[Span]:
+    """Split text into chunks of at most ``max_tokens`` and return their offsets.
+
+    Sentences are found in one regex pass and counted once each; chunks are
+    packed from whole sentences up to the budget (a sentence longer than the
+    budget is split at words), and each chunk after the first starts with the
+    trailing sentences of the previous one that fit in ``overlap_tokens``.
+    A chunk's size is the sum of its sentences' counts, and packing works on
+    their running total, so it costs a bisect per chunk rather than a step
+    per sentence. Spans are trimmed of whitespace and nothing is copied.
+    """
+    count_tokens = count_tokens or estimate_span_tokens
+    max_tokens = max(1, max_tokens)
+    spans = sentence_spans(text)
+    tokens = [count_tokens(text, start, end) for start, end in spans]
+    if any(count > max_tokens for count in tokens):
+        units: List[Span] = []
+        unit_tokens: List[int] = []
+        for (start, end), count in zip(spans, tokens):
+            if count > max_tokens:
+                pieces, counts = _split_sentence(text, start, end, max_tokens, count_tokens)
+                units += pieces
+                unit_tokens += counts
+            else:
+                units.append((start, end))
+                unit_tokens.append(count)
+        spans, tokens = units, unit_tokens
+
+    # running[k] is the number of tokens in the first k sentences
+    running = list(accumulate(tokens, initial=0))
+    chunks: List[Span] = []
+    first = 0
+    while first < len(spans):
+        # Last sentence that keeps the chunk within budget (at least the first)
+        last = max(first, bisect_right(running, running[first] + max_tokens) - 2)
+        chunks.append((spans[first][0], spans[last][1]))
+        if last == len(spans) - 1:
+            break
+        # First sentence of the trailing run that fits in the overlap, always moving forward
+        first = max(first + 1, bisect_left(running, running[last + 1] - overlap_tokens))
+    return chunks
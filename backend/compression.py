@@ -0,0 +1,47 @@
+import os
+import zlib
+from typing import Union
+from dotenv import load_dotenv
+
+load_dotenv()
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# zstd (needs the zstandard package, falls back to zlib without it) | zlib | none
+ARTICLE_COMPRESSION = os.getenv("ARTICLE_COMPRESSION", "zstd")
+ARTICLE_COMPRESSION_LEVEL = int(os.getenv("ARTICLE_COMPRESSION_LEVEL", "6"))
+# Shorter bodies aren't worth compressing
+MIN_COMPRESS_BYTES = 256
+
+# The first byte of a stored body says how the rest is encoded
+PLAIN = b"\x00"
+ZLIB = b"\x01"
+ZSTD = b"\x02"
+
+
+def compress_text(text: str) -> bytes:
+    data = text.encode("utf-8")
+    if len(data) < MIN_COMPRESS_BYTES or ARTICLE_COMPRESSION == "none":
+        return PLAIN + data
+    if ARTICLE_COMPRESSION == "zstd" and zstandard is not None:
+        return ZSTD + zstandard.ZstdCompressor(level=ARTICLE_COMPRESSION_LEVEL).compress(data)
+    return ZLIB + zlib.compress(data, ARTICLE_COMPRESSION_LEVEL)
+
+
+def decompress_text(data: Union[bytes, str]) -> str:
+    """Inverse of compress_text; text stored before compression is returned as is"""
+    if isinstance(data, str):
+        return data
+    codec, body = data[:1], data[1:]
+    if codec == ZLIB:
+        return zlib.decompress(body).decode("utf-8")
+    if codec == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Article stored with zstd; install zstandard to read it")
+        return zstandard.ZstdDecompressor().decompress(body).decode("utf-8")
+    if codec == PLAIN or not codec:
+        return body.decode("utf-8")
+    raise ValueError(f"Unknown article encoding {codec!r}")
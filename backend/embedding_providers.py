@@ -0,0 +1,210 @@
+import asyncio
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from dotenv import load_dotenv
+
+from chunking import TokenCounter, get_token_counter
+
+load_dotenv()
+
+# openai | local
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai")
+
+OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+
+# Batching limits for embeddings.create. OpenAI accepts up to 2048 inputs per
+# request; token cap is kept well below the per-request limit.
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "128"))
+EMBEDDING_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS", "100000"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "3"))
+EMBEDDING_RETRY_BACKOFF = float(os.getenv("EMBEDDING_RETRY_BACKOFF", "1.0"))
+
+# Local CPU model (requires sentence-transformers)
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+LOCAL_EMBEDDING_THREADS = int(os.getenv("LOCAL_EMBEDDING_THREADS", "2"))
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "32"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English text)"""
+    return len(text) // 4 + 1
+
+
+class EmbeddingProvider:
+    """Turns text into vectors.
+
+    ``model`` identifies the vector space and is recorded with every stored
+    vector, so embeddings from different providers are never mixed.
+    """
+
+    model: str = ""
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self.embed, texts)
+
+    def token_counter(self) -> TokenCounter:
+        """Counts tokens the way this model does, for sizing chunks"""
+        return get_token_counter()
+
+    @property
+    def slug(self) -> str:
+        """Model name usable in collection names (Chroma allows at most 63 characters)"""
+        return re.sub(r'[^a-zA-Z0-9_-]+', '-', self.model)[:40].strip('-_')
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """OpenAI embeddings API, batched by item count and estimated tokens"""
+
+    def __init__(self, model: str = OPENAI_EMBEDDING_MODEL):
+        import openai
+
+        self.model = model
+        self._openai = openai
+        self.client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        # Request-path queries use the async client so they never block the event loop
+        self.async_client = openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed many texts using as few API requests as the batch limits allow"""
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+
+        for batch in self._make_batches(texts):
+            vectors = self._embed_batch([texts[i] for i in batch])
+            for i, vector in zip(batch, vectors):
+                embeddings[i] = vector
+
+        return embeddings
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        """Async counterpart of embed, with the same batching, retries and splitting"""
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+
+        for batch in self._make_batches(texts):
+            vectors = await self._aembed_batch([texts[i] for i in batch])
+            for i, vector in zip(batch, vectors):
+                embeddings[i] = vector
+
+        return embeddings
+
+    def _make_batches(self, texts: List[str]) -> List[List[int]]:
+        """Group text indices into batches capped by item count and estimated tokens"""
+        batches = []
+        current: List[int] = []
+        current_tokens = 0
+
+        for i, text in enumerate(texts):
+            tokens = estimate_tokens(text)
+            if current and (len(current) >= EMBEDDING_BATCH_SIZE
+                            or current_tokens + tokens > EMBEDDING_BATCH_TOKENS):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+
+        if current:
+            batches.append(current)
+        return batches
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        """Embed one batch, retrying transient failures with backoff.
+
+        Only the failing batch is retried. A rejected request (400) is split in
+        half so a single bad input can't sink the rest of the article.
+        """
+        for attempt in range(EMBEDDING_MAX_RETRIES + 1):
+            try:
+                response = self.client.embeddings.create(
+                    input=batch,
+                    model=self.model
+                )
+                data = sorted(response.data, key=lambda item: item.index)
+                return [item.embedding for item in data]
+            except self._openai.BadRequestError as e:
+                if len(batch) == 1:
+                    raise e
+                print(f"Embedding batch of {len(batch)} rejected, splitting: {e}")
+                middle = len(batch) // 2
+                return self._embed_batch(batch[:middle]) + self._embed_batch(batch[middle:])
+            except Exception as e:
+                print(f"Embedding batch of {len(batch)} failed (attempt {attempt + 1}): {e}")
+                if attempt == EMBEDDING_MAX_RETRIES:
+                    raise e
+                time.sleep(EMBEDDING_RETRY_BACKOFF * (2 ** attempt))
+
+    async def _aembed_batch(self, batch: List[str]) -> List[List[float]]:
+        for attempt in range(EMBEDDING_MAX_RETRIES + 1):
+            try:
+                response = await self.async_client.embeddings.create(
+                    input=batch,
+                    model=self.model
+                )
+                data = sorted(response.data, key=lambda item: item.index)
+                return [item.embedding for item in data]
+            except self._openai.BadRequestError as e:
+                if len(batch) == 1:
+                    raise e
+                print(f"Embedding batch of {len(batch)} rejected, splitting: {e}")
+                middle = len(batch) // 2
+                return await self._aembed_batch(batch[:middle]) + await self._aembed_batch(batch[middle:])
+            except Exception as e:
+                print(f"Embedding batch of {len(batch)} failed (attempt {attempt + 1}): {e}")
+                if attempt == EMBEDDING_MAX_RETRIES:
+                    raise e
+                await asyncio.sleep(EMBEDDING_RETRY_BACKOFF * (2 ** attempt))
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """sentence-transformers model running on CPU.
+
+    All inference goes through a bounded thread pool, so concurrent requests
+    queue for a worker instead of oversubscribing the CPU.
+    """
+
+    def __init__(self, model: str = LOCAL_EMBEDDING_MODEL, threads: int = LOCAL_EMBEDDING_THREADS):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise RuntimeError(
+                "EMBEDDING_PROVIDER=local requires sentence-transformers (pip install sentence-transformers)"
+            )
+
+        self.model = model
+        self._model = SentenceTransformer(model, device="cpu")
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="local-embed")
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        vectors = self._model.encode(
+            texts,
+            batch_size=LOCAL_EMBEDDING_BATCH_SIZE,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        return vectors.tolist()
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return self._executor.submit(self._encode, texts).result()
+
+    def token_counter(self) -> TokenCounter:
+        tokenizer = self._model.tokenizer
+
+        def count(text: str, start: int, end: int) -> int:
+            return len(tokenizer.encode(text[start:end], add_special_tokens=False))
+        return count
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._encode, texts)
+
+
+def get_provider(name: str = EMBEDDING_PROVIDER) -> EmbeddingProvider:
+    if name == "openai":
+        return OpenAIEmbeddingProvider()
+    if name == "local":
+        return LocalEmbeddingProvider()
+    raise ValueError(f"Unknown embedding provider: {name}")
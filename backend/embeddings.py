@@ -1,130 +1,473 @@
+import asyncio
 import chromadb
-import openai
+import hashlib
 import os
-from typing import List, Tuple, Optional
+from collections import Counter
+from typing import Dict, List, Set, Tuple, Optional, Union
 from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from batching import MicroBatcher
+from cache import EmbeddingCache
+from chunk_store import ChunkStore
+from chunking import Span, chunk_spans
+from database import get_article_bodies
+from embedding_providers import EmbeddingProvider, get_provider
+from keyword_index import KeywordIndex, SearchResult, fuse_results
+from reranking import Candidate, Reranker, get_reranker
 
 load_dotenv()
 
+# Model whose vectors live in the original, unsuffixed collections
+DEFAULT_COLLECTION_MODEL = "text-embedding-3-small"
+
+# Query-embedding cache; leave QUERY_CACHE_PATH empty to keep it in memory only
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", "./query_cache.db")
+QUERY_CACHE_DISK_ENTRIES = int(os.getenv("QUERY_CACHE_DISK_ENTRIES", "100000"))
+
+# Concurrent query embeddings are coalesced into one provider call; a query
+# waits at most QUERY_BATCH_WINDOW_MS for others to join its batch
+QUERY_BATCH_WINDOW_MS = float(os.getenv("QUERY_BATCH_WINDOW_MS", "5"))
+QUERY_BATCH_SIZE = int(os.getenv("QUERY_BATCH_SIZE", "64"))
+
+# Content-addressed chunk embeddings shared by every user
+CHUNK_STORE_PATH = os.getenv("CHUNK_STORE_PATH", "./chunk_store.db")
+
+# BM25 index over the same chunks, for keyword and hybrid search; like the
+# collections, non-default models get their own file (path plus suffix)
+KEYWORD_INDEX_PATH = os.getenv("KEYWORD_INDEX_PATH", "./keyword_index.db")
+# Share of the vector ranking in hybrid results (reciprocal rank fusion); the rest is BM25's
+HYBRID_VECTOR_WEIGHT = float(os.getenv("HYBRID_VECTOR_WEIGHT", "0.5"))
+
+
+def chunk_hash(chunk: Union[str, bytes, memoryview], model: str) -> str:
+    """Content address of a chunk's embedding; the chunk is its text or that text's UTF-8 bytes"""
+    digest = hashlib.sha256(f"{model}\0".encode("utf-8"))
+    digest.update(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+    return digest.hexdigest()
+
 class EmbeddingService:
-    def __init__(self):
+    def __init__(self, provider: Optional[EmbeddingProvider] = None):
     
-        self.openai_client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.provider = provider or get_provider()
+        self.model = self.provider.model
+        self.count_tokens = self.provider.token_counter()
         
+        # Vectors from different models can't share an index, so every
+        # non-default model gets its own pair of collections
+        self.suffix = "" if self.model == DEFAULT_COLLECTION_MODEL else f"_{self.provider.slug}"
       
         self.chroma_client = chromadb.PersistentClient(path="./chroma_db")
         self.collection = self.chroma_client.get_or_create_collection(
-            name="articles",
+            name=f"articles{self.suffix}",
             metadata={"hnsw:space": "cosine"}
         )
+        
+        # Content-addressed store: chunk hash -> embedding, shared by every user
+        self.chunk_store = ChunkStore(CHUNK_STORE_PATH)
+        self.chunks_reused = 0
+        self.chunks_embedded = 0
+        
+        self.query_cache = EmbeddingCache(
+            maxsize=QUERY_CACHE_SIZE,
+            path=QUERY_CACHE_PATH or None,
+            max_disk_entries=QUERY_CACHE_DISK_ENTRIES
+        )
+        self.query_batcher = MicroBatcher(
+            self._embed_queries,
+            max_batch_size=QUERY_BATCH_SIZE,
+            window_ms=QUERY_BATCH_WINDOW_MS
+        )
+        
+        self.reranker: Reranker = get_reranker()
+        # Chunk ids and offsets depend on the model's tokenizer, so the keyword
+        # index mirrors this model's collection rather than being shared
+        root, ext = os.path.splitext(KEYWORD_INDEX_PATH)
+        self.keyword_index = KeywordIndex(f"{root}{self.suffix}{ext}")
     
-    def create_embedding(self, text: str) -> List[float]:
+    def start(self) -> None:
+        """Open the local stores and run pending data migrations; called at app startup"""
+        self.chunk_store.open()
+        self.keyword_index.open()
+        self.query_cache.open()
+        self._migrate_chunk_store(f"chunk_store{self.suffix}")
+        if not self.keyword_index.has_migration(f"drop_chunk_documents{self.suffix}"):
+            self._drop_chunk_documents()
+            self.keyword_index.record_migration(f"drop_chunk_documents{self.suffix}")
+        if self.keyword_index.needs_rebuild():
+            # Rebuilt from the article bodies by the app's keyword-index restore
+            print(f"Clearing the keyword index ({self.keyword_index.orphans()} orphaned entries) to rebuild it")
+            self.keyword_index.clear()
+    
+    def stop(self) -> None:
+        self.query_cache.close()
+        self.keyword_index.close()
+        self.chunk_store.close()
+    
+    def _migrate_chunk_store(self, name: str, page_size: int = 1000) -> None:
+        """Move the chunk store out of the Chroma collection it used to live in"""
         try:
-            response = self.openai_client.embeddings.create(
-                input=text,
-                model="text-embedding-3-small"
+            collection = self.chroma_client.get_collection(name)
+        except ValueError:
+            return
+        
+        offset = 0
+        while True:
+            page = collection.get(include=["embeddings", "metadatas"], limit=page_size, offset=offset)
+            if not page['ids']:
+                break
+            self.chunk_store.import_entries(
+                (h, meta.get("model", self.model), embedding, meta.get("ref_count", 0))
+                for h, embedding, meta in zip(page['ids'], page['embeddings'], page['metadatas'])
+            )
+            offset += len(page['ids'])
+        self.chroma_client.delete_collection(name)
+        print(f"Moved {offset} chunk store entries out of ChromaDB")
+    
+    def _drop_chunk_documents(self, page_size: int = 1000) -> None:
+        """Migrate chunks stored with their text to offsets only.
+
+        Chunk text is sliced from the article body, so every record still
+        carrying a document has it blanked in Chroma. The keyword index is
+        filled from the article bodies at startup; chunks from before offsets
+        were stored can't be sliced, and their articles are re-chunked and
+        re-indexed instead. Runs once per collection.
+        """
+        migrated = 0
+        offset = 0
+        while True:
+            page = self.collection.get(include=["documents"], limit=page_size, offset=offset)
+            if not page['ids']:
+                break
+            offset += len(page['ids'])
+            stored = [chunk_id for chunk_id, doc in zip(page['ids'], page['documents']) if doc]
+            if not stored:
+                continue
+            # Passing the embeddings back keeps Chroma from re-embedding the blank documents
+            vectors = self.collection.get(ids=stored, include=["embeddings"])
+            self.collection.update(
+                ids=vectors['ids'],
+                embeddings=vectors['embeddings'],
+                documents=[""] * len(vectors['ids'])
             )
-            return response.data[0].embedding
+            migrated += len(stored)
+        if migrated:
+            print(f"Dropped the text of {migrated} chunks from ChromaDB")
+    
+    def keyword_index_gaps(self, page_size: int = 1000) -> Dict[int, List[Tuple[str, dict]]]:
+        """article_id -> (chunk_id, metadata) for chunks whose text is missing from the keyword index"""
+        if self.keyword_index.count() >= self.collection.count():
+            return {}
+        
+        gaps: Dict[int, List[Tuple[str, dict]]] = {}
+        offset = 0
+        while True:
+            page = self.collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            if not page['ids']:
+                break
+            offset += len(page['ids'])
+            indexed = self.keyword_index.indexed(page['ids'])
+            for chunk_id, meta in zip(page['ids'], page['metadatas']):
+                if chunk_id not in indexed:
+                    gaps.setdefault(meta['article_id'], []).append((chunk_id, meta))
+        return gaps
+    
+    def indexed_article_ids(self, page_size: int = 1000) -> Set[int]:
+        """Ids of the articles that have vectors in this model's collection"""
+        article_ids: Set[int] = set()
+        offset = 0
+        while True:
+            # Every indexed article has a first chunk, so one record per article is enough
+            page = self.collection.get(where={"chunk_id": 0}, include=["metadatas"], limit=page_size, offset=offset)
+            if not page['ids']:
+                break
+            offset += len(page['ids'])
+            article_ids.update(meta['article_id'] for meta in page['metadatas'])
+        return article_ids
+    
+    def restore_chunk_text(self, articles: List[Tuple[int, str]],
+                           gaps: Dict[int, List[Tuple[str, dict]]]) -> List[int]:
+        """Re-index missing chunk text from article bodies and the chunks' offsets.
+
+        A chunk is only restored when the slice still hashes to the chunk's
+        content hash, so offsets into an older version of the article are
+        skipped. Returns the ids of articles that still have chunks missing.
+        """
+        chunks = []
+        incomplete = []
+        for article_id, content in articles:
+            missing = 0
+            for chunk_id, meta in gaps.get(article_id, []):
+                # Chunks indexed before offsets were stored have no start/end
+                text = content[meta['start']:meta['end']] if "start" in meta and "end" in meta else None
+                if text is not None and chunk_hash(text, self.model) == meta.get("chunk_hash"):
+                    chunks.append((
+                        chunk_id, article_id, meta['user_id'], meta['start'], meta['end'], meta.get('title', ""), text
+                    ))
+                else:
+                    missing += 1
+            if missing:
+                incomplete.append(article_id)
+        self.keyword_index.add_chunks(chunks)
+        return incomplete
+    
+    def create_embedding(self, text: str) -> List[float]:
+        """Embed a single query, served from the query cache when possible"""
+        cached = self.query_cache.get(self.model, text)
+        if cached is not None:
+            return cached
+        
+        try:
+            embedding = self.create_embeddings([text])[0]
+            self.query_cache.set(self.model, text, embedding)
+            return embedding
+        except Exception as e:
+            print(f"Error creating embedding: {e}")
+            raise e
+    
+    async def acreate_embedding(self, text: str) -> List[float]:
+        """Async create_embedding, sharing the same query cache"""
+        cached = await self.query_cache.aget(self.model, text)
+        if cached is not None:
+            return cached
+        
+        try:
+            embedding = await self.query_batcher.submit(text)
+            await self.query_cache.aset(self.model, text, embedding)
+            return embedding
         except Exception as e:
             print(f"Error creating embedding: {e}")
             raise e
     
+    async def _embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """One provider call for a batch of queries; repeated texts are embedded once"""
+        unique = list(dict.fromkeys(texts))
+        vectors = dict(zip(unique, await self.provider.aembed(unique)))
+        return [vectors[text] for text in texts]
+    
+    def create_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self.provider.embed(texts)
+    
     def add_article(self, article_id: int, content: str, metadata: dict) -> None:
-       
+        self.add_articles([(article_id, content, metadata)])
+    
+    def add_articles(self, articles: List[Tuple[int, str, dict]]) -> None:
+        """Index several articles, sharing embedding batches and one collection.upsert.
+
+        Articles that are already indexed are updated incrementally: a chunk
+        whose content hash hasn't changed keeps its vector and only gets new
+        metadata, changed chunks are embedded (or reused from the chunk store)
+        and chunks past the new end of the article are removed.
+        """
+        if not articles:
+            return
+        
         try:
-           
-            chunks = self.chunk_text(content)
+            ids, hashes, metadatas = [], [], []
+            # (article text, start, end) per chunk; text is only sliced out for chunks that changed
+            sources: List[Tuple[str, int, int]] = []
             
-            for i, chunk in enumerate(chunks):
-                embedding = self.create_embedding(chunk)
-                chunk_id = f"article_{article_id}_chunk_{i}"
-                
-                self.collection.add(
-                    embeddings=[embedding],
-                    documents=[chunk],
-                    metadatas=[{
+            for article_id, content, metadata in articles:
+                spans = self.chunk_spans(content)
+                encoded = content.encode("utf-8")
+                # Character and byte offsets agree for ASCII text, so its chunks hash without copies
+                view = memoryview(encoded) if len(encoded) == len(content) else None
+                for i, (start, end) in enumerate(spans):
+                    ids.append(f"article_{article_id}_chunk_{i}")
+                    sources.append((content, start, end))
+                    hashes.append(chunk_hash(view[start:end] if view is not None else content[start:end], self.model))
+                    metadatas.append({
                         **metadata,
                         "article_id": article_id,
                         "chunk_id": i,
-                        "total_chunks": len(chunks)
-                    }],
-                    ids=[chunk_id]
+                        "total_chunks": len(spans),
+                        "start": start,
+                        "end": end,
+                        "embedding_model": self.model
+                    })
+            
+            existing = self.collection.get(
+                where={"article_id": {"$in": [article_id for article_id, _, _ in articles]}},
+                include=["metadatas"]
+            )
+            old_hashes = {
+                chunk_id: meta.get("chunk_hash") for chunk_id, meta in zip(existing['ids'], existing['metadatas'])
+            }
+            old_titles = {chunk_id: meta.get("title") for chunk_id, meta in zip(existing['ids'], existing['metadatas'])}
+            
+            for metadata, content_hash in zip(metadatas, hashes):
+                metadata["chunk_hash"] = content_hash
+            
+            changed = [i for i, chunk_id in enumerate(ids) if old_hashes.get(chunk_id) != hashes[i]]
+            unchanged = [i for i, chunk_id in enumerate(ids) if old_hashes.get(chunk_id) == hashes[i]]
+            stale = list(set(old_hashes) - set(ids))
+            
+            documents: Dict[int, str] = {}
+            if changed:
+                changed_hashes = [hashes[i] for i in changed]
+                documents = {i: sources[i][0][sources[i][1]:sources[i][2]] for i in changed}
+                embeddings = self._acquire_chunk_embeddings([documents[i] for i in changed], changed_hashes)
+                try:
+                    # Chunk text is kept once, in the keyword index; Chroma holds offsets
+                    self.collection.upsert(
+                        embeddings=embeddings,
+                        metadatas=[metadatas[i] for i in changed],
+                        ids=[ids[i] for i in changed]
+                    )
+                except Exception:
+                    self._release_chunks(changed_hashes)
+                    raise
+            if unchanged:
+                self.collection.update(
+                    ids=[ids[i] for i in unchanged],
+                    metadatas=[metadatas[i] for i in unchanged]
+                )
+                self.chunks_reused += len(unchanged)
+            if stale:
+                self.collection.delete(ids=stale)
+            
+            # Unchanged chunks already have their text under the same id, unless
+            # it went missing or the article's title (also indexed) has changed
+            indexed = self.keyword_index.indexed([ids[i] for i in unchanged])
+            for i in unchanged:
+                if ids[i] not in indexed or old_titles.get(ids[i]) != metadatas[i]['title']:
+                    content, start, end = sources[i]
+                    documents[i] = content[start:end]
+            if documents:
+                self.keyword_index.add_chunks(
+                    (ids[i], metadatas[i]['article_id'], metadatas[i]['user_id'],
+                     metadatas[i]['start'], metadatas[i]['end'], metadatas[i]['title'], text)
+                    for i, text in documents.items()
                 )
+            self.keyword_index.delete_chunks(stale)
+            
+            # Replaced and removed records held references of their own
+            self._release_chunks([
+                old_hashes[chunk_id] for chunk_id in [ids[i] for i in changed] + stale
+                if old_hashes.get(chunk_id)
+            ])
         except Exception as e:
             print(f"error adding article to ChromaDB: {e}")
             raise e
     
+    def _acquire_chunk_embeddings(self, documents: List[str], hashes: List[str]) -> List[List[float]]:
+        """Return embeddings for chunks, only embedding text the store hasn't seen.
+
+        Takes one reference per chunk on the store entry; callers release them
+        with _release_chunks.
+        """
+        unique = list(dict.fromkeys(hashes))
+        vectors = self.chunk_store.get_vectors(unique)
+        
+        missing = [h for h in unique if h not in vectors]
+        if missing:
+            text_by_hash = dict(zip(hashes, documents))
+            new_vectors = self.create_embeddings([text_by_hash[h] for h in missing])
+            vectors.update(zip(missing, new_vectors))
+        
+        self.chunks_reused += len(hashes) - len(missing)
+        self.chunks_embedded += len(missing)
+        
+        # Entries another article stored meanwhile just gain references
+        self.chunk_store.acquire(self.model, vectors, Counter(hashes))
+        return [vectors[h] for h in hashes]
+    
+    def _release_chunks(self, hashes: List[str]) -> None:
+        """Drop one reference per hash; store entries nobody references are deleted"""
+        if hashes:
+            self.chunk_store.release(Counter(hashes))
+    
     def delete_article(self, article_id: int) -> None:
 
         try:
             results = self.collection.get(
-                where={"article_id": article_id}
+                where={"article_id": article_id},
+                include=["metadatas"]
             )
             
+            self.keyword_index.delete_article(article_id)
             if results['ids']:
                 self.collection.delete(ids=results['ids'])
+                self._release_chunks([
+                    meta["chunk_hash"] for meta in results['metadatas'] if meta.get("chunk_hash")
+                ])
         except Exception as e:
             print(f"Error deleting article from ChromaDB: {e}")
     
-    def chunk_text(self, text: str, chunk_size: int = 800, overlap: int = 150) -> List[str]:
-        """Splitting"""
-        if len(text) <= chunk_size:
-            return [text]
-        
-        chunks = []
-        start = 0
+    def chunk_store_stats(self) -> dict:
+        processed = self.chunks_reused + self.chunks_embedded
+        return {
+            "entries": self.chunk_store.count(),
+            "chunks_reused": self.chunks_reused,
+            "chunks_embedded": self.chunks_embedded,
+            "reuse_rate": self.chunks_reused / processed if processed else 0.0
+        }
+    
+    def chunk_spans(self, text: str) -> List[Span]:
+        """(start, end) offsets of the text's chunks, sized in embedding-model tokens"""
+        return chunk_spans(text, count_tokens=self.count_tokens)
+    
+    def chunk_text(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self.chunk_spans(text)]
+    
+    def query_chunks(self, query_embedding: List[float], user_id: int, n_results: int) -> List[Candidate]:
+        """Nearest chunks of the user's articles, with their embeddings for reranking.
+
+        Candidates carry the chunk's offsets; their text is filled in from the
+        article bodies by _load_texts.
+        """
+        results = self.collection.query(
+            query_embeddings=[query_embedding],
+            where={"user_id": user_id},
+            n_results=n_results,
+            include=["metadatas", "distances", "embeddings"]
+        )
         
-        while start < len(text):
-            end = start + chunk_size
-            if end < len(text):
-              
-                for punct in ['. ', '! ', '? ', '\n\n']:
-                    last_punct = text.rfind(punct, start + chunk_size - 200, end)
-                    if last_punct != -1:
-                        end = last_punct + len(punct)
-                        break
-            
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-            
-            start = max(start + chunk_size - overlap, end - overlap)
-            
-            if start >= len(text):
-                break
+        if not results['ids'] or not results['ids'][0]:
+            return []
         
-        return chunks if chunks else [text]
+        return [
+            #  distance != similarity 
+            Candidate(chunk_id, metadata['article_id'], "", float(1 - distance), embedding,
+                      metadata['start'], metadata['end'])
+            for chunk_id, metadata, distance, embedding in zip(
+                results['ids'][0],
+                results['metadatas'][0],
+                results['distances'][0],
+                results['embeddings'][0]
+            )
+            # Chunks indexed before offsets were stored are re-indexed at startup
+            if "start" in metadata and "end" in metadata
+        ]
+    
+    async def _load_texts(self, db: AsyncSession, user_id: int, candidates: List[Candidate]) -> List[Candidate]:
+        """Slice each candidate's text out of its article body, dropping chunks of deleted articles"""
+        bodies = await get_article_bodies(db, user_id, {candidate.article_id for candidate in candidates})
+        loaded = [candidate for candidate in candidates if candidate.article_id in bodies]
+        for candidate in loaded:
+            candidate.text = bodies[candidate.article_id][candidate.start:candidate.end]
+        return loaded
     
-    def search_similar_articles(self, query: str, user_id: int, limit: int = 5) -> List[Tuple[int, float, str]]:
+    async def search_similar_articles(self, db: AsyncSession, query: str, user_id: int, limit: int = 5,
+                                      query_embedding: Optional[List[float]] = None) -> List[SearchResult]:
        
         try:
-            query_embedding = self.create_embedding(query)
+            if query_embedding is None:
+                query_embedding = await self.acreate_embedding(query)
             
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                where={"user_id": user_id},
-                n_results=limit * 3,  # Get more results to deduplicate articles
-                include=["documents", "metadatas", "distances"]
-            )
-            
-            if not results['documents'] or not results['documents'][0]:
-                return []
+            # Get more results to deduplicate articles; Chroma and reranking block, so they run in threads
+            candidates = await asyncio.to_thread(self.query_chunks, query_embedding, user_id, limit * 3)
+            candidates = await self._load_texts(db, user_id, candidates)
+            ranked = await asyncio.to_thread(self.reranker.rerank, query, candidates, len(candidates))
             
             seen_articles = set()
             unique_results = []
             
-            for i, (doc, metadata, distance) in enumerate(zip(
-                results['documents'][0], 
-                results['metadatas'][0], 
-                results['distances'][0]
-            )):
-                article_id = metadata['article_id']
-                
-                if article_id not in seen_articles:
-                    #  distance != similarity 
-                    similarity = 1 - distance
-                    unique_results.append((article_id, float(similarity), doc))
-                    seen_articles.add(article_id)
+            for candidate in ranked:
+                if candidate.article_id not in seen_articles:
+                    unique_results.append((candidate.article_id, candidate.similarity, candidate.text))
+                    seen_articles.add(candidate.article_id)
                     
                     if len(unique_results) >= limit:
                         break
@@ -135,51 +478,53 @@ class EmbeddingService:
             print(f"Error searching similar articles: {e}")
             return []
     
-    def get_article_context(self, article_id: int, query: str = "", max_chunks: int = 4) -> str:
+    async def select_context_chunks(self, db: AsyncSession, query: str, query_embedding: List[float], user_id: int,
+                                    max_chunks: int, max_articles: int, min_similarity: float = 0.0) -> List[Candidate]:
+        """The best ``max_chunks`` chunks for answering a question, from at most ``max_articles`` articles"""
+        try:
+            candidates = [
+                candidate
+                for candidate in await asyncio.to_thread(self.query_chunks, query_embedding, user_id, max_chunks * 3)
+                if candidate.similarity >= min_similarity
+            ]
+            candidates = await self._load_texts(db, user_id, candidates)
+        except Exception as e:
+            print(f"Error retrieving context chunks: {e}")
+            return []
+        
+        selected: List[Candidate] = []
+        articles = set()
+        for candidate in await asyncio.to_thread(self.reranker.rerank, query, candidates, len(candidates)):
+            if candidate.article_id not in articles and len(articles) >= max_articles:
+                continue
+            articles.add(candidate.article_id)
+            selected.append(candidate)
+            if len(selected) >= max_chunks:
+                break
+        return selected
     
+    async def search_keyword(self, db: AsyncSession, query: str, user_id: int, limit: int = 5) -> List[SearchResult]:
+        """BM25 search over chunk text; needs no embedding"""
         try:
-            if query:
-              
-                query_embedding = self.create_embedding(query)
-                
-                results = self.collection.query(
-                    query_embeddings=[query_embedding],
-                    where={"article_id": article_id},
-                    n_results=max_chunks * 2,  
-                    include=["documents", "distances"]
-                )
-                
-                if results['documents'] and results['documents'][0]:
-
-                    chunk_pairs = list(zip(results['documents'][0], results['distances'][0]))
-                    chunk_pairs.sort(key=lambda x: x[1])  
-                    
-                    best_chunks = [doc for doc, _ in chunk_pairs[:max_chunks]]
-                    return " ".join(best_chunks)
-            
-         
-            results = self.collection.get(
-                where={"article_id": article_id},
-                include=["documents", "metadatas"]
-            )
-            
-            if not results['documents']:
-                return ""
-            
-            
-            if results['metadatas']:
-                chunk_data = list(zip(results['documents'], results['metadatas']))
-                chunk_data.sort(key=lambda x: x[1].get('chunk_id', 0))
-                sorted_chunks = [doc for doc, _ in chunk_data[:max_chunks]]
-                return " ".join(sorted_chunks)
-            else:
-               
-                chunks = results['documents'][:max_chunks]
-                return " ".join(chunks)
-            
+            hits = await asyncio.to_thread(self.keyword_index.search, query, user_id, limit)
+            bodies = await get_article_bodies(db, user_id, {article_id for article_id, _, _, _ in hits})
+            return [
+                (article_id, score, bodies[article_id][start:end])
+                for article_id, score, start, end in hits if article_id in bodies
+            ]
         except Exception as e:
-            print(f"Error getting article context: {e}")
-            return ""
+            print(f"Error searching keyword index: {e}")
+            return []
+    
+    async def search_hybrid(self, db: AsyncSession, query: str, user_id: int, limit: int = 5,
+                            query_embedding: Optional[List[float]] = None) -> List[SearchResult]:
+        """Vector and BM25 results for the query, fused per article"""
+        return fuse_results(
+            await self.search_similar_articles(db, query, user_id, limit, query_embedding),
+            await self.search_keyword(db, query, user_id, limit),
+            limit,
+            HYBRID_VECTOR_WEIGHT
+        )
 
 # Global ins
 embedding_service = EmbeddingService()
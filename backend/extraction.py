@@ -0,0 +1,247 @@
+import re
+import signal
+from typing import Dict, List, Optional, Tuple
+
+from bs4 import BeautifulSoup, Tag
+
+_WHITESPACE = re.compile(r'\s+')
+_DISALLOWED_CHARS = re.compile(r'[^\w\s.,!?;:()\-\'"]+')
+_ELLIPSIS = re.compile(r'\.{3,}')
+_DASHES = re.compile(r'-{2,}')
+
+def clean_text(text: str) -> str:
+    """Clean and normalize text content"""
+    if not text:
+        return ""
+    
+    text = _WHITESPACE.sub(' ', text)
+    
+    text = _DISALLOWED_CHARS.sub('', text)
+    
+   
+    text = _ELLIPSIS.sub('...', text)
+    text = _DASHES.sub('--', text)
+    
+    return text.strip()
+
+# lxml builds the tree several times faster than the pure-Python parser
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+UNWANTED_TAGS = frozenset([
+    'script', 'style', 'nav', 'header', 'footer', 'aside', 
+    'advertisement', 'ads', 'sidebar', 'menu', 'social',
+    'comment', 'comments', 'popup', 'modal', 'overlay',
+    'cookie', 'newsletter', 'subscription'
+])
+
+# Any class or id containing one of these (case-insensitive) is dropped
+UNWANTED_ATTRIBUTE = re.compile('|'.join([
+    'nav', 'menu', 'sidebar', 'footer', 'header', 'ad', 'advertisement',
+    'social', 'share', 'comment', 'popup', 'modal', 'cookie',
+    'newsletter', 'subscription', 'related', 'recommended'
+]), re.I)
+
+# Candidates in priority order. Only the selector forms used here are
+# supported: tag, .class, #id, [role="..."], tag.class and "ancestor target".
+TITLE_SELECTORS = [
+    'h1.title',
+    'h1.post-title', 
+    'h1.entry-title',
+    'h1.article-title',
+    '.title h1',
+    'article h1',
+    'h1',
+    'title'
+]
+
+CONTENT_SELECTORS = [
+    'article .content',
+    'article .post-content',
+    'article .entry-content', 
+    'article .article-content',
+    'article .article-body',
+    '.post-content',
+    '.entry-content',
+    '.article-content',
+    '.article-body',
+    '.content',
+    'article',
+    '[role="main"]',
+    'main .content',
+    'main',
+    '.main-content',
+    '#content',
+    '#main-content'
+]
+
+_SIMPLE_SELECTOR = re.compile(r'^([\w-]+)?(?:\.([\w-]+))?(?:#([\w-]+))?(?:\[role="([\w-]+)"\])?$')
+
+# (tag, class, id, role); None matches anything
+Simple = Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]
+
+def _parse_simple(selector: str) -> Simple:
+    match = _SIMPLE_SELECTOR.match(selector)
+    if not match or not any(match.groups()):
+        raise ValueError(f"Unsupported selector: {selector}")
+    return match.groups()
+
+def _compile_selectors(selectors: List[str]) -> List[Tuple[Optional[Simple], Simple]]:
+    compiled = []
+    for selector in selectors:
+        parts = selector.split()
+        ancestor = _parse_simple(parts[0]) if len(parts) == 2 else None
+        compiled.append((ancestor, _parse_simple(parts[-1])))
+    return compiled
+
+def _index_key(simple: Simple) -> Tuple[str, str]:
+    """Most selective part of a simple selector, used to look up candidates per element"""
+    tag, class_, id_, role = simple
+    if class_:
+        return ('class', class_)
+    if id_:
+        return ('id', id_)
+    if role:
+        return ('role', role)
+    return ('tag', tag)
+
+def _matches(element: Tag, simple: Simple) -> bool:
+    tag, class_, id_, role = simple
+    return ((tag is None or element.name == tag)
+            and (class_ is None or class_ in element.get('class', ()))
+            and (id_ is None or element.get('id') == id_)
+            and (role is None or element.get('role') == role))
+
+def _has_ancestor(element: Tag, simple: Simple) -> bool:
+    parent = element.parent
+    while parent is not None and parent.name != '[document]':
+        if _matches(parent, simple):
+            return True
+        parent = parent.parent
+    return False
+
+# Every title and content selector, numbered, and indexed by lookup key
+_SELECTORS = _compile_selectors(TITLE_SELECTORS + CONTENT_SELECTORS)
+_SELECTOR_INDEX: Dict[Tuple[str, str], List[int]] = {}
+for _number, (_, _target) in enumerate(_SELECTORS):
+    _SELECTOR_INDEX.setdefault(_index_key(_target), []).append(_number)
+
+def _is_unwanted(element: Tag) -> bool:
+    if element.name in UNWANTED_TAGS:
+        return True
+    classes = element.get('class')
+    if classes and any(UNWANTED_ATTRIBUTE.search(value) for value in classes):
+        return True
+    id_ = element.get('id')
+    return bool(id_ and UNWANTED_ATTRIBUTE.search(id_))
+
+def scan_document(soup: BeautifulSoup) -> Tuple[Dict[int, Tag], Optional[Tag]]:
+    """Single pre-order pass over the tree.
+
+    Removes unwanted elements (skipping their subtrees) and records, for each
+    selector in _SELECTORS, the first element left in the document that it
+    matches, which is what select_one would find after the removal. Returns
+    those matches by selector number, and the body element.
+    """
+    first: Dict[int, Tag] = {}
+    body = None
+    stack = [child for child in reversed(soup.contents) if isinstance(child, Tag)]
+    
+    while stack:
+        element = stack.pop()
+        if _is_unwanted(element):
+            element.decompose()
+            continue
+        
+        if body is None and element.name == 'body':
+            body = element
+        
+        keys = [('tag', element.name)]
+        keys.extend(('class', value) for value in element.get('class', ()))
+        if element.get('id'):
+            keys.append(('id', element['id']))
+        if element.get('role'):
+            keys.append(('role', element['role']))
+        
+        for key in keys:
+            for number in _SELECTOR_INDEX.get(key, ()):
+                if number in first:
+                    continue
+                ancestor, target = _SELECTORS[number]
+                if _matches(element, target) and (ancestor is None or _has_ancestor(element, ancestor)):
+                    first[number] = element
+        
+        stack.extend(child for child in reversed(element.contents) if isinstance(child, Tag))
+    
+    return first, body
+
+def extract_title(first: Dict[int, Tag]) -> str:
+    """Extract title with multiple fallback so we can have more robustness"""
+    for number in range(len(TITLE_SELECTORS)):
+        element = first.get(number)
+        if element:
+            title = element.get_text().strip()
+            if title and len(title) > 5:  # no super short titles
+                return clean_text(title)
+    
+    return "Untitled"
+
+def extract_content(first: Dict[int, Tag], body: Optional[Tag]) -> str:
+    """Extract main content, trying the content selectors in priority order"""
+    for number in range(len(TITLE_SELECTORS), len(_SELECTORS)):
+        content_element = first.get(number)
+        if content_element:
+          
+            paragraphs = content_element.find_all('p')
+            if paragraphs:
+                texts = (p.get_text().strip() for p in paragraphs)
+                content = ' '.join(text for text in texts if text)
+            else:
+                content = content_element.get_text(separator=' ', strip=True)
+            
+            content = clean_text(content)
+            
+          
+            if len(content) > 200 and len(content.split()) > 50:
+                return content
+    
+    # nav/header/footer/aside are already gone from the body
+    if body:
+        return clean_text(body.get_text(separator=' ', strip=True))
+    
+    return ""
+
+def parse_article(html: bytes) -> Tuple[str, str]:
+    """Parse a page and return its (title, content); CPU-bound"""
+    soup = BeautifulSoup(html, HTML_PARSER)
+    first, body = scan_document(soup)
+    return extract_title(first), extract_content(first, body)
+
+
+class ParseTimeout(Exception):
+    pass
+
+def _raise_timeout(signum, frame):
+    raise ParseTimeout()
+
+def warm_worker() -> None:
+    """Process-pool initializer: load the parser before the first real page"""
+    # Shutdown is driven by the parent; don't dump tracebacks on Ctrl-C
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    parse_article(b"<html><head><title>warm up</title></head><body><p>ready</p></body></html>")
+
+def parse_with_timeout(html: bytes, timeout: float) -> Tuple[str, str]:
+    """parse_article for pool workers, aborted with ParseTimeout after ``timeout`` seconds"""
+    if timeout <= 0 or not hasattr(signal, "setitimer"):
+        return parse_article(html)
+    
+    previous = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return parse_article(html)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
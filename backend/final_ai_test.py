@@ -33,10 +33,14 @@ def final_ai_test():
     
     for article_data in test_articles:
         response = requests.post(f"{BASE_URL}/articles", json=article_data, headers=headers)
-        if response.status_code == 200:
-            article = response.json()
-            print(f"✅ Added: {article['title']}")
-            print(f"   Content: {len(article['content'])} chars")
+        if response.status_code == 202:
+            article_id = response.json()["id"]
+            for _ in range(60):
+                status_data = requests.get(f"{BASE_URL}/articles/{article_id}/status", headers=headers).json()
+                if status_data["status"] in ("ready", "failed"):
+                    break
+                time.sleep(1)
+            print(f"✅ Added article {article_id}: {status_data['status']}")
     
    
     complex_queries = [
@@ -0,0 +1,348 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+from dotenv import load_dotenv
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal, Article
+from scraper import extract_article_content, get_host
+from embeddings import embedding_service
+from cache import answer_cache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Concurrent scrapes across all users, and against any single host
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "8"))
+INGESTION_PER_HOST = int(os.getenv("INGESTION_PER_HOST", "2"))
+# Upper bound on articles whose chunks are embedded together
+EMBED_BATCH_ARTICLES = int(os.getenv("EMBED_BATCH_ARTICLES", "32"))
+# Scheduled refresh: re-scrape ready articles older than this (0 disables),
+# checking every REFRESH_CHECK_SECONDS and queueing at most REFRESH_BATCH at a time
+REFRESH_INTERVAL_HOURS = float(os.getenv("REFRESH_INTERVAL_HOURS", "0"))
+REFRESH_CHECK_SECONDS = float(os.getenv("REFRESH_CHECK_SECONDS", "600"))
+REFRESH_BATCH = int(os.getenv("REFRESH_BATCH", "100"))
+
+IN_PROGRESS = ["pending", "scraping", "embedding"]
+
+
+async def _set_status(db: AsyncSession, article: Article, status: str, error: Optional[str] = None) -> None:
+    article.status = status
+    article.error = error
+    await db.commit()
+
+async def _scrape_failed(db: AsyncSession, article: Article, error: str) -> None:
+    if article.content:
+        # A failed refresh keeps serving the version that is already indexed
+        await _set_status(db, article, "ready", f"Refresh failed: {error}")
+    else:
+        await _set_status(db, article, "failed", error)
+
+async def scrape_article(article_id: int) -> bool:
+    """Fetch and store the content of a pending article.
+
+    Also used to refresh an indexed article. Returns True when the article is
+    ready to be embedded, which for a refresh means its content changed.
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            article = await db.get(Article, article_id)
+            if article is None:
+                return False  # deleted while queued
+
+            await _set_status(db, article, "scraping")
+            scraped_data = await extract_article_content(article.url)
+            if not scraped_data:
+                await _scrape_failed(db, article, "Could not extract content from URL")
+                return False
+
+            article.refreshed_at = datetime.utcnow()
+            if article.content == scraped_data['content'] and article.title == scraped_data['title']:
+                await _set_status(db, article, "ready")
+                return False
+
+            article.url = scraped_data['url']
+            article.staged_title = scraped_data['title']
+            article.staged_content = scraped_data['content']
+            await _set_status(db, article, "embedding")
+            return True
+        except Exception as e:
+            logger.error(f"Unexpected error scraping article {article_id}: {e}")
+            await db.rollback()
+            article = await db.get(Article, article_id)
+            if article is not None:
+                await _scrape_failed(db, article, str(e))
+            return False
+
+def _index_item(article: Article, title: str, content: str) -> Tuple[int, str, dict]:
+    return (article.id, content, {
+        "title": title,
+        "url": article.url,
+        "user_id": article.user_id,
+        "tags": article.tags
+    })
+
+async def _index_failed(db: AsyncSession, article: Article, error: str) -> None:
+    refresh = article.staged_content is not None and bool(article.content)
+    article.staged_title = None
+    article.staged_content = None
+    if not refresh:
+        await _set_status(db, article, "failed", f"Indexing failed: {error}")
+        return
+    # A refresh that couldn't be indexed keeps the previous version; put its
+    # chunks back in case the failure came after part of the new one was written
+    try:
+        await asyncio.to_thread(embedding_service.add_articles, [_index_item(article, article.title, article.content)])
+    except Exception as e:
+        logger.error(f"Could not restore the index of article {article.id}: {e}")
+    await _set_status(db, article, "ready", f"Refresh failed: Indexing failed: {error}")
+
+async def index_articles(article_ids: List[int]) -> None:
+    """Embed and index scraped articles in shared batches.
+
+    A scraped version replaces the article's title and content only once it
+    has been indexed.
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(Article).where(
+                Article.id.in_(article_ids),
+                Article.status == "embedding"
+            )
+        )
+        articles = result.scalars().all()
+        if not articles:
+            return
+
+        batch = [
+            _index_item(article, article.staged_title, article.staged_content)
+            if article.staged_content is not None else _index_item(article, article.title, article.content)
+            for article in articles
+        ]
+
+        # Chroma and the batched embedding calls are blocking; run them in a thread.
+        # Re-indexing a refreshed article only embeds its changed chunks.
+        try:
+            await asyncio.to_thread(embedding_service.add_articles, batch)
+            indexed = articles
+        except Exception as e:
+            # Retry one by one so a single bad article doesn't fail the batch
+            logger.warning(f"Batch indexing of {len(batch)} articles failed, retrying individually: {e}")
+            indexed = []
+            for article, item in zip(articles, batch):
+                try:
+                    await asyncio.to_thread(embedding_service.add_articles, [item])
+                    indexed.append(article)
+                except Exception as item_error:
+                    await _index_failed(db, article, str(item_error))
+
+        # Articles may have been deleted while they were being embedded
+        indexed_ids = [article.id for article in indexed]
+        result = await db.execute(select(Article.id).where(Article.id.in_(indexed_ids)))
+        remaining = set(result.scalars())
+        for article in indexed:
+            if article.id in remaining:
+                if article.staged_content is not None:
+                    article.title = article.staged_title
+                    article.content = article.staged_content
+                    article.staged_title = None
+                    article.staged_content = None
+                article.status = "ready"
+                article.error = None
+            else:
+                await asyncio.to_thread(embedding_service.delete_article, article.id)
+        await db.commit()
+        # Newly indexed chunks can change answers over the owners' collections
+        for user_id in {article.user_id for article in indexed}:
+            answer_cache.invalidate_user(user_id)
+        logger.info(f"Indexed {len(remaining)} articles")
+
+async def _unfinished_articles() -> List[Tuple[int, str, str]]:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(Article.id, Article.url, Article.status).where(
+                Article.status.in_(IN_PROGRESS)
+            )
+        )
+        return [(row.id, row.url, row.status) for row in result]
+
+async def restore_keyword_index() -> None:
+    """Rebuild keyword-index rows that went missing from the article bodies.
+
+    Chroma keeps each chunk's offsets into the article content, so chunk text
+    lost with the keyword index is recovered without re-scraping or re-embedding.
+    Ready articles with chunks that can't be recovered that way are marked for
+    re-indexing, which the queue resumes on start.
+    """
+    gaps = await asyncio.to_thread(embedding_service.keyword_index_gaps)
+    if not gaps:
+        return
+    article_ids = list(gaps)
+    reindexed = 0
+    async with AsyncSessionLocal() as db:
+        for i in range(0, len(article_ids), EMBED_BATCH_ARTICLES):
+            result = await db.execute(
+                select(Article).where(Article.id.in_(article_ids[i:i + EMBED_BATCH_ARTICLES]))
+            )
+            articles = result.scalars().all()
+            incomplete = set(await asyncio.to_thread(
+                embedding_service.restore_chunk_text,
+                [(article.id, article.content) for article in articles if article.content],
+                gaps
+            ))
+            for article in articles:
+                if article.id in incomplete and article.status == "ready":
+                    article.status = "embedding"
+                    reindexed += 1
+        await db.commit()
+    logger.info(f"Restored keyword index text for {len(article_ids)} articles; {reindexed} queued for re-indexing")
+
+async def backfill_index() -> None:
+    """Re-index ready articles that have no vectors under the current embedding model.
+
+    Each model has its own collection and keyword index, so after switching
+    EMBEDDING_PROVIDER the library is re-embedded in the background instead of
+    silently dropping out of vector search. The queue resumes the articles on start.
+    """
+    indexed = await asyncio.to_thread(embedding_service.indexed_article_ids)
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(Article.id).where(Article.status == "ready"))
+        missing = [article_id for article_id in result.scalars() if article_id not in indexed]
+        for i in range(0, len(missing), 500):
+            await db.execute(
+                update(Article).where(Article.id.in_(missing[i:i + 500])).values(status="embedding")
+            )
+        await db.commit()
+    if missing:
+        logger.info(f"Queued {len(missing)} articles with no vectors for {embedding_service.model} for re-indexing")
+
+async def queue_refresh(db: AsyncSession, articles: List[Article]) -> None:
+    """Mark articles pending and queue them to be re-scraped and re-indexed"""
+    for article in articles:
+        article.status = "pending"
+        article.error = None
+    await db.commit()
+    for article in articles:
+        ingestion_queue.submit(article.id, article.url)
+
+async def _refresh_due_articles() -> int:
+    cutoff = datetime.utcnow() - timedelta(hours=REFRESH_INTERVAL_HOURS)
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(Article).where(
+                Article.status == "ready",
+                func.coalesce(Article.refreshed_at, Article.created_at) < cutoff
+            ).order_by(func.coalesce(Article.refreshed_at, Article.created_at)).limit(REFRESH_BATCH)
+        )
+        articles = result.scalars().all()
+        await queue_refresh(db, articles)
+        return len(articles)
+
+
+class IngestionQueue:
+    """Background pipeline that runs ingestion off the request path.
+
+    Scrapes are bounded globally and per host; a host slot is taken before a
+    global one so a backlog for one site never starves the others. Scraped
+    articles go to a single embed stage that drains everything ready and embeds
+    it together. Fetching and the database are async; the remaining blocking
+    steps (parsing, Chroma, batched embedding) run off the event loop.
+    """
+
+    def __init__(self, workers: int = INGESTION_WORKERS, per_host: int = INGESTION_PER_HOST):
+        self.workers = workers
+        self.per_host = per_host
+        self._scrape_slots: Optional[asyncio.Semaphore] = None
+        # Per-host semaphores, with the number of scrapes holding or waiting on each
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        self._host_users: Dict[str, int] = {}
+        self._embed_queue: Optional[asyncio.Queue] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._embed_task: Optional[asyncio.Task] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._scrape_slots = asyncio.Semaphore(self.workers)
+        self._embed_queue = asyncio.Queue()
+        self._embed_task = asyncio.create_task(self._embed_worker())
+        if REFRESH_INTERVAL_HOURS > 0:
+            self._refresh_task = asyncio.create_task(self._refresh_worker())
+
+        # Resume articles a previous process accepted but never finished
+        for article_id, url, status in await _unfinished_articles():
+            if status == "embedding":
+                self._embed_queue.put_nowait(article_id)
+            else:
+                self.submit(article_id, url)
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks) + [task for task in (self._embed_task, self._refresh_task) if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._embed_task = None
+        self._refresh_task = None
+
+    def submit(self, article_id: int, url: str) -> None:
+        task = asyncio.create_task(self._scrape(article_id, url))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def qsize(self) -> int:
+        return len(self._tasks) + (self._embed_queue.qsize() if self._embed_queue else 0)
+
+    @asynccontextmanager
+    async def _host_slot(self, url: str) -> AsyncIterator[None]:
+        host = get_host(url)
+        if host not in self._host_slots:
+            self._host_slots[host] = asyncio.Semaphore(self.per_host)
+        self._host_users[host] = self._host_users.get(host, 0) + 1
+        try:
+            async with self._host_slots[host]:
+                yield
+        finally:
+            # Forget hosts nothing is scraping or waiting on, so the map stays bounded
+            self._host_users[host] -= 1
+            if not self._host_users[host]:
+                del self._host_users[host]
+                del self._host_slots[host]
+
+    async def _scrape(self, article_id: int, url: str) -> None:
+        try:
+            async with self._host_slot(url):
+                async with self._scrape_slots:
+                    scraped = await scrape_article(article_id)
+            if scraped:
+                self._embed_queue.put_nowait(article_id)
+        except Exception as e:
+            logger.error(f"Ingestion error for article {article_id}: {e}")
+
+    async def _embed_worker(self) -> None:
+        while True:
+            batch = [await self._embed_queue.get()]
+            while len(batch) < EMBED_BATCH_ARTICLES and not self._embed_queue.empty():
+                batch.append(self._embed_queue.get_nowait())
+            try:
+                await index_articles(batch)
+            except Exception as e:
+                logger.error(f"Embedding error for articles {batch}: {e}")
+
+    async def _refresh_worker(self) -> None:
+        while True:
+            try:
+                queued = await _refresh_due_articles()
+                if queued:
+                    logger.info(f"Queued {queued} articles for scheduled refresh")
+            except Exception as e:
+                logger.error(f"Scheduled refresh failed: {e}")
+            await asyncio.sleep(REFRESH_CHECK_SECONDS)
+
+# Global instance
+ingestion_queue = IngestionQueue()
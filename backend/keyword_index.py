@@ -0,0 +1,218 @@
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# (article_id, score, chunk text), best first
+SearchResult = Tuple[int, float, str]
+# (article_id, score, start, end): a keyword match and its chunk's offsets in the article
+KeywordHit = Tuple[int, float, int, int]
+
+# Query terms are quoted so user input is never parsed as FTS5 syntax
+_TERM = re.compile(r'\w+')
+
+# Layout of the index file, kept in PRAGMA user_version. An index in an older
+# layout is dropped on open, and its rows are rebuilt at startup from the
+# article bodies like any other missing rows.
+SCHEMA_VERSION = 3
+
+# Constant of reciprocal rank fusion: larger values flatten the gap between ranks
+RRF_K = 60
+
+
+def match_expression(query: str) -> str:
+    """FTS5 query matching chunks that contain any of the query's terms"""
+    return " OR ".join(f'"{term}"' for term in _TERM.findall(query))
+
+
+def fuse_results(vector_results: List[SearchResult], keyword_results: List[SearchResult],
+                 limit: int, vector_weight: float = 0.5, k: int = RRF_K) -> List[SearchResult]:
+    """Merge per-article vector and keyword results by weighted reciprocal rank fusion.
+
+    Each list adds weight / (k + rank) for the articles it returns, so only
+    the order within a list counts, not how its scores are scaled: relative
+    BM25 puts the top keyword hit at 1.0 however weak the match. Scores are
+    scaled so an article ranked first in both lists scores 1. The snippet
+    comes from the vector result when there is one.
+    """
+    scores: Dict[int, float] = {}
+    snippets: Dict[int, str] = {}
+    for weight, results in ((1 - vector_weight, keyword_results), (vector_weight, vector_results)):
+        for rank, (article_id, _, doc) in enumerate(results, 1):
+            scores[article_id] = scores.get(article_id, 0.0) + weight * (k + 1) / (k + rank)
+            snippets[article_id] = doc
+
+    ranked = sorted(scores, key=scores.get, reverse=True)[:limit]
+    return [(article_id, scores[article_id], snippets[article_id]) for article_id in ranked]
+
+
+class KeywordIndex:
+    """Persistent full-text index of article chunks, ranked with BM25.
+
+    Chunk text and the article title are indexed in a contentless FTS5
+    table, which keeps the inverted index but not the text: the article body
+    is the only copy, and matches come back as offsets into it. A plain side
+    table maps the FTS rowids to chunk ids, articles, users and offsets, so
+    chunks can be filtered per user without scanning the full-text table.
+
+    Without the original text a contentless row can't be removed, so deleting
+    or replacing a chunk drops only its side-table row; searches join through
+    the side table and never see the orphaned entry. Once orphans outnumber
+    live rows the index should be cleared and rebuilt from the article
+    bodies (see needs_rebuild). The file is only created by open().
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.queries = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+    def open(self) -> None:
+        """Connect, creating the file and tables on first use"""
+        with self._lock:
+            if self._db is None:
+                self._db = sqlite3.connect(self.path, check_same_thread=False)
+                if self._db.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                    self._drop_tables()
+                self._create_tables()
+
+    def _drop_tables(self) -> None:
+        self._db.executescript("DROP TABLE IF EXISTS chunk_text; DROP TABLE IF EXISTS chunk_rows;")
+
+    def _create_tables(self) -> None:
+        # AUTOINCREMENT: a rowid is never reused while an orphaned FTS entry may still carry it
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS chunk_rows ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, chunk_id TEXT NOT NULL UNIQUE, "
+            "article_id INTEGER NOT NULL, user_id INTEGER NOT NULL, "
+            "start INTEGER NOT NULL, end INTEGER NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS ix_chunk_rows_article_id ON chunk_rows (article_id);"
+            "CREATE VIRTUAL TABLE IF NOT EXISTS chunk_text USING fts5("
+            "title, text, content = '', tokenize = 'porter unicode61 remove_diacritics 2');"
+            "CREATE TABLE IF NOT EXISTS migrations (name TEXT PRIMARY KEY);"
+            f"PRAGMA user_version = {SCHEMA_VERSION};"
+        )
+        self._db.commit()
+
+    def clear(self) -> None:
+        """Drop every chunk, orphaned entries included, ahead of a rebuild"""
+        with self._lock:
+            self._drop_tables()
+            self._create_tables()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _delete_rows(self, rowids: List[int]) -> None:
+        # The FTS entries stay behind as orphans (see the class docstring)
+        if rowids:
+            self._db.execute(f"DELETE FROM chunk_rows WHERE id IN ({','.join('?' * len(rowids))})", rowids)
+
+    def _rowids(self, column: str, values: List) -> List[int]:
+        rowids = []
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(values), 500):
+            batch = values[i:i + 500]
+            rowids += [row[0] for row in self._db.execute(
+                f"SELECT id FROM chunk_rows WHERE {column} IN ({','.join('?' * len(batch))})", batch
+            )]
+        return rowids
+
+    def add_chunks(self, chunks: Iterable[Tuple[str, int, int, int, int, str, str]]) -> None:
+        """Insert or replace (chunk_id, article_id, user_id, start, end, title, text) rows.
+
+        The text is indexed, not stored; start and end are its offsets in the article.
+        """
+        chunks = list(chunks)
+        if not chunks:
+            return
+        with self._lock:
+            self._delete_rows(self._rowids("chunk_id", [chunk[0] for chunk in chunks]))
+            for chunk_id, article_id, user_id, start, end, title, text in chunks:
+                cursor = self._db.execute(
+                    "INSERT INTO chunk_rows (chunk_id, article_id, user_id, start, end) VALUES (?, ?, ?, ?, ?)",
+                    (chunk_id, article_id, user_id, start, end)
+                )
+                self._db.execute(
+                    "INSERT INTO chunk_text (rowid, title, text) VALUES (?, ?, ?)", (cursor.lastrowid, title, text)
+                )
+            self._db.commit()
+
+    def indexed(self, chunk_ids: List[str]) -> Set[str]:
+        """The chunk ids that have a row in the index"""
+        found = set()
+        with self._lock:
+            for i in range(0, len(chunk_ids), 500):
+                batch = chunk_ids[i:i + 500]
+                found.update(row[0] for row in self._db.execute(
+                    f"SELECT chunk_id FROM chunk_rows WHERE chunk_id IN ({','.join('?' * len(batch))})", batch
+                ))
+        return found
+
+    def delete_chunks(self, chunk_ids: List[str]) -> None:
+        with self._lock:
+            self._delete_rows(self._rowids("chunk_id", chunk_ids))
+            self._db.commit()
+
+    def delete_article(self, article_id: int) -> None:
+        with self._lock:
+            self._delete_rows(self._rowids("article_id", [article_id]))
+            self._db.commit()
+
+    def search(self, query: str, user_id: int, limit: int = 5) -> List[KeywordHit]:
+        """Best-matching chunk per article, scored by BM25 relative to the top hit"""
+        expression = match_expression(query)
+        if not expression:
+            return []
+
+        with self._lock:
+            self.queries += 1
+            rows = self._db.execute(
+                "SELECT r.article_id, -bm25(chunk_text), r.start, r.end "
+                "FROM chunk_text JOIN chunk_rows r ON r.id = chunk_text.rowid "
+                "WHERE chunk_text MATCH ? AND r.user_id = ? "
+                "ORDER BY bm25(chunk_text) LIMIT ?",
+                (expression, user_id, limit * 3)
+            ).fetchall()
+
+        results: List[KeywordHit] = []
+        seen = set()
+        for article_id, score, start, end in rows:
+            if article_id not in seen:
+                seen.add(article_id)
+                results.append((article_id, score, start, end))
+                if len(results) >= limit:
+                    break
+
+        best = results[0][1] if results and results[0][1] > 0 else 1.0
+        return [(article_id, max(0.0, score) / best, start, end) for article_id, score, start, end in results]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM chunk_rows").fetchone()[0]
+
+    def orphans(self) -> int:
+        """FTS entries left behind by deleted or replaced chunks"""
+        with self._lock:
+            total = self._db.execute("SELECT COUNT(*) FROM chunk_text").fetchone()[0]
+            return total - self._db.execute("SELECT COUNT(*) FROM chunk_rows").fetchone()[0]
+
+    def needs_rebuild(self) -> bool:
+        """Orphans outnumber live chunks, inflating the index and skewing BM25 statistics"""
+        return self.orphans() > self.count()
+
+    def has_migration(self, name: str) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM migrations WHERE name = ?", (name,)).fetchone() is not None
+
+    def record_migration(self, name: str) -> None:
+        with self._lock:
+            self._db.execute("INSERT OR IGNORE INTO migrations (name) VALUES (?)", (name,))
+            self._db.commit()
+
+    def stats(self) -> dict:
+        return {"chunks": self.count(), "orphans": self.orphans(), "queries": self.queries}
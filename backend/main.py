@@ -1,34 +1,68 @@
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException, Depends, status
+from dataclasses import dataclass, field
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Tuple
 from datetime import timedelta, datetime
+import asyncio
+import base64
+import hashlib
+import json
 import os
 from dotenv import load_dotenv
 import openai
 
-from database import create_tables, get_db, User, Article
+from database import create_tables, engine, get_db, get_article_page, get_articles_by_ids, User, Article
 from auth import (
     authenticate_user, create_access_token, get_current_user, 
-    create_user, get_user_by_email, ACCESS_TOKEN_EXPIRE_MINUTES
+    create_user, get_user_by_email, password_hasher, ACCESS_TOKEN_EXPIRE_MINUTES
 )
-from scraper import extract_article_content
+from scraper import is_valid_url, close_client, page_cache, parser_pool
 from embeddings import embedding_service
+from ingestion import IN_PROGRESS, backfill_index, ingestion_queue, queue_refresh, restore_keyword_index
+from cache import answer_cache, principal_cache
+from reranking import Candidate
 
 load_dotenv()
 
 
-client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+async_client = openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+QA_MODEL = "gpt-4o-mini"
+QA_SYSTEM_PROMPT = "You are a knowledgeable research assistant that answers questions based on the user's saved articles. Always cite which articles you're drawing from. If the context doesn't fully answer the question, mention what information is missing and provide the best answer possible from available content."
+QA_ERROR_ANSWER = "Sorry, I couldn't generate an answer at this time. Please try again later."
+# Chunks packed into a Q&A prompt after reranking, and the similarity a chunk needs to be considered
+QA_CONTEXT_CHUNKS = int(os.getenv("QA_CONTEXT_CHUNKS", "6"))
+QA_MIN_SIMILARITY = float(os.getenv("QA_MIN_SIMILARITY", "0.12"))
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     
-    create_tables()
+    await create_tables()
+    await asyncio.to_thread(embedding_service.start)
+    await restore_keyword_index()
+    await backfill_index()
+    if page_cache:
+        await asyncio.to_thread(page_cache.open)
+    await parser_pool.start()
+    await ingestion_queue.start()
     yield
-    pass
+    await ingestion_queue.stop()
+    await embedding_service.query_batcher.drain()
+    await close_client()
+    if page_cache:
+        page_cache.close()
+    embedding_service.stop()
+    parser_pool.stop()
+    password_hasher.stop()
+    await engine.dispose()
 
 app = FastAPI(title="Personal Research Companion API", version="1.0.0", lifespan=lifespan)
 
@@ -39,6 +73,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
 # Pydantic 
@@ -64,14 +99,60 @@ class ArticleResponse(BaseModel):
     url: str
     content: str
     tags: str
+    status: str
+    error: Optional[str] = None
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class ArticleSummary(BaseModel):
+    id: int
+    title: str
+    url: str
+    tags: str
+    status: str
+    error: Optional[str] = None
     created_at: datetime
     
     class Config:
         from_attributes = True
 
+class ArticleStatus(BaseModel):
+    id: int
+    url: str
+    status: str
+    error: Optional[str] = None
+    
+    class Config:
+        from_attributes = True
+
+class BulkArticleCreate(BaseModel):
+    urls: List[str]
+    tags: Optional[str] = ""
+
+class BulkImportResult(BaseModel):
+    url: str
+    status: str
+    article_id: Optional[int] = None
+    error: Optional[str] = None
+
+MAX_BULK_URLS = int(os.getenv("MAX_BULK_URLS", "1000"))
+
+# Article listing page size (?limit=), default and maximum
+ARTICLE_PAGE_SIZE = int(os.getenv("ARTICLE_PAGE_SIZE", "50"))
+MAX_ARTICLE_PAGE_SIZE = int(os.getenv("MAX_ARTICLE_PAGE_SIZE", "200"))
+
+# hybrid | vector | keyword; keyword search makes no embedding call
+SEARCH_MODE = os.getenv("SEARCH_MODE", "hybrid")
+
+# /metrics exposes server internals, so it is off unless enabled and always needs a login
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+
 class SearchQuery(BaseModel):
     query: str
     limit: Optional[int] = 5
+    mode: Optional[Literal["hybrid", "vector", "keyword"]] = None
 
 class QAQuery(BaseModel):
     question: str
@@ -80,8 +161,8 @@ class QAQuery(BaseModel):
 
 # Auth endpoints
 @app.post("/auth/register", response_model=Token)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = get_user_by_email(db, email=user.email)
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    db_user = await get_user_by_email(db, email=user.email)
     if db_user:
         raise HTTPException(
             status_code=400,
@@ -89,19 +170,19 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
         )
     
 
-    created_user = create_user(db, email=user.email, password=user.password)
+    created_user = await create_user(db, email=user.email, password=user.password)
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": created_user.email},
+        data={"sub": created_user.email, "uid": created_user.id},
         expires_delta=access_token_expires
     )
     
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/auth/login", response_model=Token)
-async def login(user: UserLogin, db: Session = Depends(get_db)):
-    authenticated_user = authenticate_user(db, user.email, user.password)
+async def login(user: UserLogin, db: AsyncSession = Depends(get_db)):
+    authenticated_user = await authenticate_user(db, user.email, user.password)
     if not authenticated_user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -111,87 +192,267 @@ async def login(user: UserLogin, db: Session = Depends(get_db)):
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": authenticated_user.email},
+        data={"sub": authenticated_user.email, "uid": authenticated_user.id},
         expires_delta=access_token_expires
     )
     
     return {"access_token": access_token, "token_type": "bearer"}
 
 
-@app.post("/articles", response_model=ArticleResponse)
+@app.post("/articles", response_model=ArticleResponse, status_code=status.HTTP_202_ACCEPTED)
 async def create_article(
     article_data: ArticleCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-  
-    scraped_data = extract_article_content(article_data.url)
-    if not scraped_data:
+    if not is_valid_url(article_data.url):
         raise HTTPException(
             status_code=400,
-            detail="Could not extract content from URL"
+            detail="Invalid URL"
         )
     
-    
+    # Scraping and embedding happen in the background; the title is a
+    # placeholder until the page has been fetched.
     db_article = Article(
-        title=scraped_data['title'],
-        url=scraped_data['url'],
-        content=scraped_data['content'],
+        title=article_data.url,
+        url=article_data.url,
+        content="",
         tags=article_data.tags,
+        status="pending",
         user_id=current_user.id
     )
     
     db.add(db_article)
-    db.commit()
-    db.refresh(db_article)
+    await db.commit()
+    await db.refresh(db_article)
     
-    # Add article to ChromaDB
-    try:
-        embedding_service.add_article(
-            article_id=db_article.id,
-            content=scraped_data['content'],
-            metadata={
-                "title": scraped_data['title'],
-                "url": scraped_data['url'],
-                "user_id": current_user.id,
-                "tags": article_data.tags
-            }
-        )
-    except Exception as e:
-        print(f"Error adding article to ChromaDB: {e}")
+    ingestion_queue.submit(db_article.id, db_article.url)
+    answer_cache.invalidate_user(current_user.id)
     
     return db_article
 
-@app.get("/articles", response_model=List[ArticleResponse])
-async def get_articles(
+@app.post("/articles/bulk", response_model=List[BulkImportResult], status_code=status.HTTP_202_ACCEPTED)
+async def bulk_import_articles(
+    bulk_data: BulkArticleCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    articles = db.query(Article).filter(Article.user_id == current_user.id).all()
+    if len(bulk_data.urls) > MAX_BULK_URLS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BULK_URLS} URLs can be imported at once"
+        )
+    
+    urls = [url.strip() for url in bulk_data.urls]
+    result = await db.execute(
+        select(Article.id, Article.url).where(
+            Article.user_id == current_user.id,
+            Article.url.in_(urls)
+        )
+    )
+    existing = {row.url: row.id for row in result}
+    
+    results: List[BulkImportResult] = []
+    new_articles = []
+    seen = set()
+    for url in urls:
+        if not is_valid_url(url):
+            results.append(BulkImportResult(url=url, status="invalid", error="Invalid URL"))
+        elif url in existing:
+            results.append(BulkImportResult(url=url, status="exists", article_id=existing[url]))
+        elif url in seen:
+            results.append(BulkImportResult(url=url, status="duplicate"))
+        else:
+            seen.add(url)
+            article = Article(
+                title=url,
+                url=url,
+                content="",
+                tags=bulk_data.tags,
+                status="pending",
+                user_id=current_user.id
+            )
+            new_articles.append(article)
+            results.append(BulkImportResult(url=url, status="pending"))
+    
+    db.add_all(new_articles)
+    await db.commit()
+    if new_articles:
+        answer_cache.invalidate_user(current_user.id)
+    
+    created = iter(new_articles)
+    for result in results:
+        if result.status == "pending":
+            article = next(created)
+            result.article_id = article.id
+            ingestion_queue.submit(article.id, article.url)
+    
+    return results
+
+@app.get("/articles/status", response_model=List[ArticleStatus])
+async def get_article_statuses(
+    ids: List[int] = Query(...),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    result = await db.execute(
+        select(Article.id, Article.url, Article.status, Article.error).where(
+            Article.id.in_(ids),
+            Article.user_id == current_user.id
+        )
+    )
+    return result.all()
+
+@app.get("/articles/{article_id}/status", response_model=ArticleStatus)
+async def get_article_status(
+    article_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    result = await db.execute(
+        select(Article.id, Article.url, Article.status, Article.error).where(
+            Article.id == article_id,
+            Article.user_id == current_user.id
+        )
+    )
+    article = result.first()
+    
+    if not article:
+        raise HTTPException(status_code=404, detail="Article not found")
+    
+    return article
+
+@app.post("/articles/refresh", response_model=List[ArticleStatus], status_code=status.HTTP_202_ACCEPTED)
+async def refresh_articles(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Re-scrape the user's whole library; only changed chunks are re-embedded"""
+    result = await db.execute(
+        select(Article).options(
+            load_only(Article.id, Article.url, Article.status, Article.error)
+        ).where(
+            Article.user_id == current_user.id,
+            Article.status.not_in(IN_PROGRESS)
+        )
+    )
+    articles = result.scalars().all()
+    await queue_refresh(db, articles)
     return articles
 
+@app.post("/articles/{article_id}/refresh", response_model=ArticleStatus, status_code=status.HTTP_202_ACCEPTED)
+async def refresh_article(
+    article_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    result = await db.execute(
+        select(Article).where(
+            Article.id == article_id,
+            Article.user_id == current_user.id
+        )
+    )
+    article = result.scalar_one_or_none()
+    
+    if not article:
+        raise HTTPException(status_code=404, detail="Article not found")
+    if article.status in IN_PROGRESS:
+        raise HTTPException(status_code=409, detail="Article is already being processed")
+    
+    await queue_refresh(db, [article])
+    return article
+
+def encode_cursor(article: Article) -> str:
+    """Opaque listing cursor pointing just past ``article``"""
+    key = f"{article.created_at.isoformat()},{article.id}"
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        key = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, article_id = key.rsplit(",", 1)
+        return datetime.fromisoformat(created_at), int(article_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def etag_response(request: Request, payload: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    """JSON response tagged with a hash of its body; 304 if the client already has that body"""
+    body = json.dumps(jsonable_encoder(payload), separators=(",", ":")).encode()
+    etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    headers = {**(headers or {}), "ETag": etag, "Cache-Control": "private, no-cache"}
+    
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+@app.get("/articles", response_model=List[ArticleSummary])
+async def get_articles(
+    request: Request,
+    limit: int = Query(ARTICLE_PAGE_SIZE, ge=1, le=MAX_ARTICLE_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """One page of the library, newest first, without article bodies.
+
+    When there are more articles, the X-Next-Cursor header holds the
+    ``cursor`` for the next page.
+    """
+    articles = await get_article_page(db, current_user.id, limit + 1, decode_cursor(cursor) if cursor else None)
+    
+    headers = {}
+    if len(articles) > limit:
+        articles = articles[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(articles[-1])
+    
+    return etag_response(request, [ArticleSummary.model_validate(article) for article in articles], headers)
+
+@app.get("/articles/{article_id}", response_model=ArticleResponse)
+async def get_article(
+    article_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    result = await db.execute(
+        select(Article).where(
+            Article.id == article_id,
+            Article.user_id == current_user.id
+        )
+    )
+    article = result.scalar_one_or_none()
+    
+    if not article:
+        raise HTTPException(status_code=404, detail="Article not found")
+    
+    return etag_response(request, ArticleResponse.model_validate(article))
+
 @app.delete("/articles/{article_id}")
 async def delete_article(
     article_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    article = db.query(Article).filter(
-        Article.id == article_id,
-        Article.user_id == current_user.id
-    ).first()
+    result = await db.execute(
+        select(Article).where(
+            Article.id == article_id,
+            Article.user_id == current_user.id
+        )
+    )
+    article = result.scalars().first()
     
     if not article:
         raise HTTPException(status_code=404, detail="Article not found")
     
     # Delete article from ChromaDB
     try:
-        embedding_service.delete_article(article.id)
+        await asyncio.to_thread(embedding_service.delete_article, article.id)
     except Exception as e:
         print(f"Error deleting article from ChromaDB: {e}")
     
-    db.delete(article)
-    db.commit()
+    await db.delete(article)
+    await db.commit()
+    answer_cache.invalidate_user(current_user.id)
     
     return {"message": "Article deleted successfully"}
 
@@ -199,25 +460,46 @@ async def delete_article(
 async def search_articles(
     search_query: SearchQuery,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
    
-    similar_results = embedding_service.search_similar_articles(
-        query=search_query.query,
-        user_id=current_user.id,
-        limit=search_query.limit
-    )
+    mode = search_query.mode or SEARCH_MODE
+    if mode == "keyword":
+        similar_results = await embedding_service.search_keyword(
+            db,
+            search_query.query,
+            current_user.id,
+            search_query.limit
+        )
+    else:
+        try:
+            query_embedding = await embedding_service.acreate_embedding(search_query.query)
+            search = embedding_service.search_hybrid if mode == "hybrid" else embedding_service.search_similar_articles
+            similar_results = await search(
+                db,
+                query=search_query.query,
+                user_id=current_user.id,
+                limit=search_query.limit,
+                query_embedding=query_embedding
+            )
+        except Exception as e:
+            # Without a query embedding, BM25 results are still better than none
+            print(f"Vector search unavailable, falling back to keyword search: {e}")
+            similar_results = await embedding_service.search_keyword(
+                db,
+                search_query.query,
+                current_user.id,
+                search_query.limit
+            )
     
     if not similar_results:
         return {"results": [], "message": "No articles found"}
     
     # Get article details from database
+    articles = await get_articles_by_ids(db, current_user.id, [article_id for article_id, _, _ in similar_results])
     results = []
     for article_id, similarity_score, content_snippet in similar_results:
-        article = db.query(Article).filter(
-            Article.id == article_id,
-            Article.user_id == current_user.id
-        ).first()
+        article = articles.get(article_id)
         
         if article:
             results.append({
@@ -234,85 +516,200 @@ async def search_articles(
     
     return {"results": results}
 
-@app.post("/qa")
-async def answer_question(
-    qa_query: QAQuery,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-   
-    similar_results = embedding_service.search_similar_articles(
-        query=qa_query.question,
-        user_id=current_user.id,
-        limit=qa_query.limit
+@dataclass
+class QAContext:
+    context_parts: List[str] = field(default_factory=list)
+    sources: List[dict] = field(default_factory=list)
+    # Set when nothing relevant was found and no completion should be requested
+    fallback_answer: Optional[str] = None
+    # The fallback answer reports a failure rather than an empty result
+    failed: bool = False
+    query_embedding: Optional[List[float]] = None
+    fingerprint: str = ""
+    # Answer-cache generation read before retrieval (see AnswerCache.set)
+    generation: int = 0
+
+async def build_qa_context(question: str, limit: int, user_id: int, db: AsyncSession) -> QAContext:
+    """Retrieve the excerpts, sources and chunk fingerprint for a question"""
+    generation = answer_cache.generation(user_id)
+    try:
+        query_embedding = await embedding_service.acreate_embedding(question)
+    except Exception:
+        # acreate_embedding has already logged the provider error
+        return QAContext(fallback_answer=QA_ERROR_ANSWER, failed=True)
+    chunks = await embedding_service.select_context_chunks(
+        db,
+        question,
+        query_embedding,
+        user_id,
+        max_chunks=QA_CONTEXT_CHUNKS,
+        max_articles=limit,
+        min_similarity=QA_MIN_SIMILARITY
     )
     
-    if not similar_results:
-        return {"answer": "No articles found in your collection to answer this question."}
+    if not chunks:
+        return QAContext(fallback_answer="No relevant articles found to answer your question.")
     
-   
-    context_parts = []
-    source_articles = []
+    qa_context = QAContext(query_embedding=query_embedding, generation=generation)
     
-
-    max_similarity = max([score for _, score, _ in similar_results], default=0)
-    adaptive_threshold = max(0.12, min(0.25, max_similarity * 0.6))  # Dynamic threshold
+    # Reranked chunks, grouped per article in the order the articles first appear
+    grouped: Dict[int, List[Candidate]] = {}
+    for chunk in chunks:
+        grouped.setdefault(chunk.article_id, []).append(chunk)
     
-    for article_id, similarity_score, content_snippet in similar_results:
-        if similarity_score > adaptive_threshold:
-            article = db.query(Article).filter(
-                Article.id == article_id,
-                Article.user_id == current_user.id
-            ).first()
-            
-            if article:
-                #increasing relevance
-                full_context = embedding_service.get_article_context(
-                    article_id, 
-                    query=qa_query.question, 
-                    max_chunks=3
-                )
-                context_parts.append(f"From '{article.title}': {full_context}")
-                source_articles.append({
-                    "title": article.title,
-                    "url": article.url,
-                    "similarity_score": similarity_score
-                })
+    chunk_ids = []
+    articles = await get_articles_by_ids(db, user_id, list(grouped))
+    for article_id, article_chunks in grouped.items():
+        article = articles.get(article_id)
+        
+        if article:
+            chunk_ids.extend(chunk.chunk_id for chunk in article_chunks)
+            qa_context.context_parts.append(
+                f"From '{article.title}': {' '.join(chunk.text for chunk in article_chunks)}"
+            )
+            qa_context.sources.append({
+                "title": article.title,
+                "url": article.url,
+                "similarity_score": max(chunk.similarity for chunk in article_chunks)
+            })
     
-    if not context_parts:
-        return {"answer": "No relevant articles found to answer your question."}
+    if not qa_context.context_parts:
+        return QAContext(fallback_answer="No relevant articles found to answer your question.")
     
+    qa_context.fingerprint = answer_cache.fingerprint(chunk_ids)
+    return qa_context
+
+def qa_messages(context_parts: List[str], question: str) -> List[dict]:
     context = "\n\n".join(context_parts)
+    return [
+        {
+            "role": "system",
+            "content": QA_SYSTEM_PROMPT
+        },
+        {
+            "role": "user", 
+            "content": f"Based on these excerpts from my saved articles:\n\n{context}\n\nQuestion: {question}\n\nPlease provide a detailed, well-structured answer. Reference specific articles when possible and indicate if you need more information to give a complete answer. "
+        }
+    ]
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/qa")
+async def answer_question(
+    qa_query: QAQuery,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+   
+    qa_context = await build_qa_context(qa_query.question, qa_query.limit, current_user.id, db)
+    if qa_context.fallback_answer:
+        return {"answer": qa_context.fallback_answer}
+    
+    cached = answer_cache.get(current_user.id, qa_context.fingerprint, qa_query.question, qa_context.query_embedding)
+    if cached is not None:
+        return cached
     
    
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a knowledgeable research assistant that answers questions based on the user's saved articles. Always cite which articles you're drawing from. If the context doesn't fully answer the question, mention what information is missing and provide the best answer possible from available content."
-                },
-                {
-                    "role": "user", 
-                    "content": f"Based on these excerpts from my saved articles:\n\n{context}\n\nQuestion: {qa_query.question}\n\nPlease provide a detailed, well-structured answer. Reference specific articles when possible and indicate if you need more information to give a complete answer. "
-                }
-            ],
+        response = await async_client.chat.completions.create(
+            model=QA_MODEL,
+            messages=qa_messages(qa_context.context_parts, qa_query.question),
             max_tokens=800,
             temperature=0.3
         )
         
         answer = response.choices[0].message.content
         
-        return {
+        result = {
             "answer": answer,
-            "sources": source_articles,
-            "context_used": len(context_parts)
+            "sources": qa_context.sources,
+            "context_used": len(qa_context.context_parts)
         }
+        answer_cache.set(current_user.id, qa_context.generation, qa_context.fingerprint, qa_query.question, result, qa_context.query_embedding)
+        return result
         
     except Exception as e:
         print(f"OpenAI API error: {e}")
-        return {"answer": "Sorry, I couldn't generate an answer at this time. Please try again later."}
+        return {"answer": QA_ERROR_ANSWER}
+
+@app.post("/qa/stream")
+async def answer_question_stream(
+    qa_query: QAQuery,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Server-Sent Events: `sources` first, then `token` events as the answer
+    is generated, then `done`. A failed completion sends `error` before `done`."""
+    qa_context = await build_qa_context(qa_query.question, qa_query.limit, current_user.id, db)
+    user_id = current_user.id
+    
+    async def events() -> AsyncIterator[str]:
+        yield sse_event("sources", {"sources": qa_context.sources, "context_used": len(qa_context.context_parts)})
+        
+        if qa_context.failed:
+            yield sse_event("error", {"message": qa_context.fallback_answer})
+            yield sse_event("done", {})
+            return
+        if qa_context.fallback_answer:
+            yield sse_event("token", {"text": qa_context.fallback_answer})
+            yield sse_event("done", {})
+            return
+        
+        cached = answer_cache.get(user_id, qa_context.fingerprint, qa_query.question, qa_context.query_embedding)
+        if cached is not None:
+            yield sse_event("token", {"text": cached["answer"]})
+            yield sse_event("done", {})
+            return
+        
+        answer_parts = []
+        try:
+            stream = await async_client.chat.completions.create(
+                model=QA_MODEL,
+                messages=qa_messages(qa_context.context_parts, qa_query.question),
+                max_tokens=800,
+                temperature=0.3,
+                stream=True
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    answer_parts.append(chunk.choices[0].delta.content)
+                    yield sse_event("token", {"text": chunk.choices[0].delta.content})
+            
+            answer_cache.set(user_id, qa_context.generation, qa_context.fingerprint, qa_query.question, {
+                "answer": "".join(answer_parts),
+                "sources": qa_context.sources,
+                "context_used": len(qa_context.context_parts)
+            }, qa_context.query_embedding)
+        except Exception as e:
+            print(f"OpenAI API error: {e}")
+            yield sse_event("error", {"message": QA_ERROR_ANSWER})
+        
+        yield sse_event("done", {})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/metrics")
+async def metrics(current_user: User = Depends(get_current_user)):
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return {
+        "query_embedding_cache": embedding_service.query_cache.stats(),
+        "query_embedding_batcher": embedding_service.query_batcher.stats(),
+        "chunk_store": await asyncio.to_thread(embedding_service.chunk_store_stats),
+        "keyword_index": await asyncio.to_thread(embedding_service.keyword_index.stats),
+        "reranker": embedding_service.reranker.stats(),
+        "answer_cache": answer_cache.stats(),
+        "principal_cache": principal_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "page_cache": page_cache.stats() if page_cache else None,
+        "parser_pool": parser_pool.stats(),
+        "ingestion_backlog": ingestion_queue.qsize()
+    }
 
 @app.get("/")
 async def root():
@@ -0,0 +1,175 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# none | mmr | cross-encoder
+RERANKER = os.getenv("RERANKER", "mmr")
+# Time a rerank may take, including any wait for a cross-encoder worker.
+# Whatever hasn't been reranked when it runs out keeps its retrieval order.
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "150"))
+# 1 ranks purely by relevance, lower values favour chunks unlike those already picked
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+
+# Local cross-encoder (requires sentence-transformers)
+CROSS_ENCODER_MODEL = os.getenv("CROSS_ENCODER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+CROSS_ENCODER_THREADS = int(os.getenv("CROSS_ENCODER_THREADS", "2"))
+CROSS_ENCODER_BATCH_SIZE = int(os.getenv("CROSS_ENCODER_BATCH_SIZE", "16"))
+
+
+@dataclass
+class Candidate:
+    """A retrieved chunk on its way to the response"""
+    chunk_id: str
+    article_id: int
+    text: str
+    # Cosine similarity to the query from the vector search
+    similarity: float
+    embedding: Optional[List[float]] = None
+    # Offsets of the text in the article body
+    start: int = 0
+    end: int = 0
+
+
+class Reranker:
+    """Reorders retrieved chunks and keeps the best ``limit`` of them.
+
+    Candidates arrive in retrieval order. Subclasses implement ``_rerank``
+    and must stop once ``deadline`` (a time.perf_counter value) has passed.
+    """
+
+    name = "none"
+
+    def __init__(self):
+        self.reranks = 0
+        self.over_budget = 0
+        self.total_ms = 0.0
+        self._lock = threading.Lock()
+
+    def rerank(self, query: str, candidates: List[Candidate], limit: int,
+               budget_ms: float = RERANK_BUDGET_MS) -> List[Candidate]:
+        started = time.perf_counter()
+        deadline = started + budget_ms / 1000
+        ranked = self._rerank(query, candidates, limit, deadline) if len(candidates) > 1 else candidates
+        finished = time.perf_counter()
+        with self._lock:
+            self.reranks += 1
+            self.over_budget += finished > deadline
+            self.total_ms += (finished - started) * 1000
+        return ranked[:limit]
+
+    def _rerank(self, query: str, candidates: List[Candidate], limit: int, deadline: float) -> List[Candidate]:
+        return candidates
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "reranker": self.name,
+                "budget_ms": RERANK_BUDGET_MS,
+                "reranks": self.reranks,
+                "over_budget": self.over_budget,
+                "avg_ms": self.total_ms / self.reranks if self.reranks else 0.0
+            }
+
+
+class MMRReranker(Reranker):
+    """Maximal marginal relevance over the chunk embeddings.
+
+    Each pick maximises ``lambda * similarity - (1 - lambda) * redundancy``,
+    where redundancy is the highest cosine similarity to a chunk already
+    picked, so near-duplicate chunks don't crowd out other sources.
+    """
+
+    name = "mmr"
+
+    def __init__(self, mmr_lambda: float = MMR_LAMBDA):
+        super().__init__()
+        self.mmr_lambda = mmr_lambda
+
+    def _rerank(self, query: str, candidates: List[Candidate], limit: int, deadline: float) -> List[Candidate]:
+        if any(candidate.embedding is None for candidate in candidates):
+            return candidates
+
+        vectors = np.asarray([candidate.embedding for candidate in candidates], dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        pairwise = vectors @ vectors.T
+        relevance = np.asarray([candidate.similarity for candidate in candidates], dtype=np.float32)
+
+        redundancy = np.zeros(len(candidates), dtype=np.float32)
+        remaining = np.ones(len(candidates), dtype=bool)
+        picked: List[int] = []
+        while len(picked) < limit and remaining.any() and time.perf_counter() < deadline:
+            scores = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * redundancy
+            best = int(np.argmax(np.where(remaining, scores, -np.inf)))
+            picked.append(best)
+            remaining[best] = False
+            redundancy = np.maximum(redundancy, pairwise[best])
+
+        return [candidates[i] for i in picked] + [
+            candidate for i, candidate in enumerate(candidates) if remaining[i]
+        ]
+
+
+class CrossEncoderReranker(Reranker):
+    """sentence-transformers cross-encoder scoring (query, chunk) pairs on CPU.
+
+    Pairs are scored in batches in retrieval order on a bounded thread pool;
+    when the budget runs out, unscored chunks follow the scored ones. If the
+    budget runs out while waiting for a worker, the retrieval order is kept.
+    """
+
+    name = "cross-encoder"
+
+    def __init__(self, model: str = CROSS_ENCODER_MODEL, threads: int = CROSS_ENCODER_THREADS):
+        super().__init__()
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError:
+            raise RuntimeError(
+                "RERANKER=cross-encoder requires sentence-transformers (pip install sentence-transformers)"
+            )
+
+        self.model = model
+        self._model = CrossEncoder(model, device="cpu")
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="cross-encoder")
+
+    def _score(self, query: str, candidates: List[Candidate], deadline: float) -> List[float]:
+        scores: List[float] = []
+        for i in range(0, len(candidates), CROSS_ENCODER_BATCH_SIZE):
+            if time.perf_counter() >= deadline:
+                break
+            batch = candidates[i:i + CROSS_ENCODER_BATCH_SIZE]
+            scores += self._model.predict(
+                [(query, candidate.text) for candidate in batch],
+                batch_size=CROSS_ENCODER_BATCH_SIZE,
+                show_progress_bar=False
+            ).tolist()
+        return scores
+
+    def _rerank(self, query: str, candidates: List[Candidate], limit: int, deadline: float) -> List[Candidate]:
+        future = self._executor.submit(self._score, query, candidates, deadline)
+        try:
+            scores = future.result(timeout=max(0.0, deadline - time.perf_counter()))
+        except TimeoutError:
+            # The worker stops at its next batch; the request doesn't wait for it
+            future.cancel()
+            return candidates
+        scored = sorted(zip(scores, candidates), key=lambda pair: pair[0], reverse=True)
+        return [candidate for _, candidate in scored] + candidates[len(scores):]
+
+
+def get_reranker(name: str = RERANKER) -> Reranker:
+    if name == "none":
+        return Reranker()
+    if name == "mmr":
+        return MMRReranker()
+    if name == "cross-encoder":
+        return CrossEncoderReranker()
+    raise ValueError(f"Unknown reranker: {name}")
@@ -1,28 +1,51 @@
-import requests
-from bs4 import BeautifulSoup
-from typing import Dict, Optional, List
+import asyncio
+import httpx
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+import os
 import re
-import time
-from urllib.parse import urljoin, urlparse
+import threading
+from urllib.parse import urlparse
 import logging
 
+from cache import PageCache
+from extraction import ParseTimeout, parse_article, parse_with_timeout, warm_worker
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def clean_text(text: str) -> str:
-    """Clean and normalize text content"""
-    if not text:
-        return ""
-    
-    text = re.sub(r'\s+', ' ', text)
-    
-    text = re.sub(r'[^\w\s.,!?;:()\-\'"]+', '', text)
-    
-   
-    text = re.sub(r'\.{3,}', '...', text)
-    text = re.sub(r'-{2,}', '--', text)
-    
-    return text.strip()
+# Connection pool sizing for the shared session
+POOL_HOSTS = int(os.getenv("SCRAPER_POOL_HOSTS", "32"))
+POOL_SIZE_PER_HOST = int(os.getenv("SCRAPER_POOL_SIZE_PER_HOST", "4"))
+
+# Scraped pages and their validators, for conditional re-fetching; leave
+# PAGE_CACHE_PATH empty to disable
+PAGE_CACHE_PATH = os.getenv("PAGE_CACHE_PATH", "./page_cache.db")
+PAGE_CACHE_ENTRIES = int(os.getenv("PAGE_CACHE_ENTRIES", "10000"))
+
+# HTML parsing runs in worker processes so it scales with cores and never
+# competes with the event loop for the GIL; PARSE_WORKERS=0 parses in a thread
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Pages waiting for or being parsed at once; further scrapes wait their turn
+PARSE_MAX_PENDING = int(os.getenv("PARSE_MAX_PENDING", str(max(1, PARSE_WORKERS) * 2)))
+PARSE_TIMEOUT = float(os.getenv("PARSE_TIMEOUT", "20"))
+
+# Page bodies are streamed and cut off at SCRAPER_MAX_BYTES (after decompression).
+# Past SCRAPER_EARLY_STOP_BYTES, reading stops as soon as the main content has
+# closed, so the comments and footers of very long pages are never downloaded.
+SCRAPER_MAX_BYTES = int(os.getenv("SCRAPER_MAX_BYTES", str(5 * 1024 * 1024)))
+SCRAPER_EARLY_STOP_BYTES = int(os.getenv("SCRAPER_EARLY_STOP_BYTES", str(512 * 1024)))
+
+# Closing tag of the main content, matched on raw bytes: tag names are ASCII in
+# every charset lxml will be asked to decode, so the stream needn't be decoded here
+_CONTENT_END = re.compile(rb'</(?:article|main)\s*>', re.I)
+_CONTENT_END_OVERLAP = 16
+
+_client: Optional[httpx.AsyncClient] = None
+# Opened by the app at startup; until then pages are fetched without the cache
+page_cache = PageCache(PAGE_CACHE_PATH, PAGE_CACHE_ENTRIES) if PAGE_CACHE_PATH else None
 
 def get_headers() -> Dict[str, str]:
     """Get realistic browser headers for requests"""
@@ -35,6 +58,140 @@ def get_headers() -> Dict[str, str]:
         'Upgrade-Insecure-Requests': '1',
     }
 
+def get_client() -> httpx.AsyncClient:
+    """Shared async client so connections are pooled and kept alive across scrapes"""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            headers=get_headers(),
+            timeout=15,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=POOL_HOSTS * POOL_SIZE_PER_HOST,
+                max_keepalive_connections=POOL_HOSTS
+            )
+        )
+    return _client
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+class ParserPool:
+    """Bounded pool of warm worker processes for parse_article.
+
+    Workers receive the raw page bytes and send back only (title, content).
+    A semaphore bounds how many pages are queued or in flight. Each parse is
+    interrupted inside the worker after PARSE_TIMEOUT seconds; if the worker
+    doesn't answer shortly after that, the pool is replaced.
+    """
+
+    def __init__(self, workers: int = PARSE_WORKERS, max_pending: int = PARSE_MAX_PENDING,
+                 timeout: float = PARSE_TIMEOUT):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.pending = 0
+        self.timeouts = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        # Guards creating and replacing the executor; nothing awaits while holding it
+        self._lock = threading.Lock()
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        # Workers are forked from a server process that has imported only the
+        # parser, not from the app, so they don't inherit its threads and open
+        # handles (Chroma, SQLite, the event loop). Both forkserver and spawn
+        # also import the launching script in each worker, which is why the
+        # app is started with uvicorn rather than `python main.py`.
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload(["extraction"])
+        else:
+            context = multiprocessing.get_context("spawn")
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=warm_worker)
+
+    async def start(self) -> None:
+        """Start the workers now rather than on the first scrape"""
+        with self._lock:
+            if self._slots is not None:
+                return
+            self._slots = asyncio.Semaphore(self.max_pending)
+            if self.workers <= 0:
+                return
+            executor = self._executor = self._create_executor()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(executor, parse_article, b"<html></html>")
+            for _ in range(self.workers)
+        ))
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            self._slots = None
+
+    def _restart(self, old: ProcessPoolExecutor, reason: str) -> None:
+        """Replace an executor and kill its workers, unless a concurrent caller already has"""
+        with self._lock:
+            if self._executor is not old:
+                return
+            logger.error(f"{reason}; restarting the HTML parser pool")
+            # shutdown() leaves a worker that is stuck in a parse running
+            processes = list((old._processes or {}).values())
+            old.shutdown(wait=False, cancel_futures=True)
+            for process in processes:
+                process.terminate()
+            self._executor = self._create_executor()
+
+    async def parse(self, html: bytes) -> Tuple[str, str]:
+        loop = asyncio.get_running_loop()
+        if self._slots is None:
+            await self.start()
+        
+        self.pending += 1
+        executor = None
+        try:
+            async with self._slots:
+                if self.workers <= 0:
+                    return await loop.run_in_executor(None, parse_article, html)
+                
+                executor = self._executor
+                future = loop.run_in_executor(executor, parse_with_timeout, html, self.timeout)
+                return await asyncio.wait_for(future, self.timeout + 5)
+        except ParseTimeout:
+            self.timeouts += 1
+            raise
+        except asyncio.TimeoutError:
+            # The worker didn't interrupt itself (stuck outside Python code) and
+            # still holds its slot in the pool; replace the pool for later pages
+            self.timeouts += 1
+            self._restart(executor, "HTML parser worker stopped responding")
+            raise
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool for later pages
+            self._restart(executor, "HTML parser pool broke")
+            raise
+        finally:
+            self.pending -= 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "timeouts": self.timeouts
+        }
+
+parser_pool = ParserPool()
+
+def get_host(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
 def is_valid_url(url: str) -> bool:
     try:
         result = urlparse(url)
@@ -42,144 +199,73 @@ def is_valid_url(url: str) -> bool:
     except Exception:
         return False
 
-def remove_unwanted_elements(soup: BeautifulSoup) -> None:
-    """Remove unwanted HTML elements"""
-    unwanted_tags = [
-        'script', 'style', 'nav', 'header', 'footer', 'aside', 
-        'advertisement', 'ads', 'sidebar', 'menu', 'social',
-        'comment', 'comments', 'popup', 'modal', 'overlay',
-        'cookie', 'newsletter', 'subscription'
-    ]
-    
-    # Remove by tag name
-    for tag in unwanted_tags:
-        for element in soup.find_all(tag):
-            element.decompose()
-    
-    # Remove by class/id patterns
-    unwanted_patterns = [
-        'nav', 'menu', 'sidebar', 'footer', 'header', 'ad', 'advertisement',
-        'social', 'share', 'comment', 'popup', 'modal', 'cookie',
-        'newsletter', 'subscription', 'related', 'recommended'
-    ]
-    
-    for pattern in unwanted_patterns:
-        # Remove by class
-        for element in soup.find_all(attrs={'class': re.compile(pattern, re.I)}):
-            element.decompose()
-        # Remove by id
-        for element in soup.find_all(attrs={'id': re.compile(pattern, re.I)}):
-            element.decompose()
-
-def extract_title(soup: BeautifulSoup) -> str:
-    """Extract title with multiple fallback so we can have more robustness"""
-    title_selectors = [
-        'h1.title',
-        'h1.post-title', 
-        'h1.entry-title',
-        'h1.article-title',
-        '.title h1',
-        'article h1',
-        'h1',
-        'title'
-    ]
-    
-    for selector in title_selectors:
-        element = soup.select_one(selector)
-        if element:
-            title = element.get_text().strip()
-            if title and len(title) > 5:  # no super short titles
-                return clean_text(title)
-    
-    return "Untitled"
+async def read_page(response: httpx.Response, url: str) -> bytes:
+    """Read a streamed page body, capped at SCRAPER_MAX_BYTES and stopping early
+    once a long page's main content has been read"""
+    body = bytearray()
+    scanned = 0
+    async for chunk in response.aiter_bytes():
+        body += chunk
+        if len(body) >= SCRAPER_MAX_BYTES:
+            logger.warning(f"Page exceeds {SCRAPER_MAX_BYTES} bytes; parsing only the start of {url}")
+            del body[SCRAPER_MAX_BYTES:]
+            break
+        if len(body) >= SCRAPER_EARLY_STOP_BYTES:
+            if _CONTENT_END.search(body, max(0, scanned - _CONTENT_END_OVERLAP)):
+                logger.info(f"Main content closed after {len(body)} bytes; not reading the rest of {url}")
+                break
+            scanned = len(body)
+    return bytes(body)
 
-def extract_content(soup: BeautifulSoup) -> str:
-    """Extract main content with improved selectors"""
-   
-    content_selectors = [
-        'article .content',
-        'article .post-content',
-        'article .entry-content', 
-        'article .article-content',
-        'article .article-body',
-        '.post-content',
-        '.entry-content',
-        '.article-content',
-        '.article-body',
-        '.content',
-        'article',
-        '[role="main"]',
-        'main .content',
-        'main',
-        '.main-content',
-        '#content',
-        '#main-content'
-    ]
-    
-    for selector in content_selectors:
-        content_element = soup.select_one(selector)
-        if content_element:
-          
-            paragraphs = content_element.find_all('p')
-            if paragraphs:
-                content = ' '.join([p.get_text().strip() for p in paragraphs if p.get_text().strip()])
-            else:
-                content = content_element.get_text(separator=' ', strip=True)
-            
-            content = clean_text(content)
-            
-          
-            if len(content) > 200 and len(content.split()) > 50:
-                return content
-    
-
-    body = soup.find('body')
-    if body:
-       
-        for nav in body.find_all(['nav', 'header', 'footer', 'aside']):
-            nav.decompose()
-        
-        content = body.get_text(separator=' ', strip=True)
-        content = clean_text(content)
-        return content
-    
-    return ""
-
-def extract_article_content(url: str, retry_count: int = 2) -> Optional[Dict[str, str]]:
+async def extract_article_content(url: str, retry_count: int = 2) -> Optional[Dict[str, str]]:
    
     if not is_valid_url(url):
         logger.error(f"Invalid URL format: {url}")
         return None
     
+    # The page cache is SQLite; keep its reads and commits off the event loop
+    cache = page_cache if page_cache and page_cache.is_open else None
+    cached = await asyncio.to_thread(cache.get, url) if cache else None
+    
     for attempt in range(retry_count + 1):
         try:
             logger.info(f"Attempting to scrape {url} (attempt {attempt + 1})")
             
-            session = requests.Session()
-            session.headers.update(get_headers())
+            client = get_client()
             
             # Add delay 
             if attempt > 0:
-                time.sleep(2)
+                await asyncio.sleep(2)
             
-            response = session.get(url, timeout=15, allow_redirects=True)
-            response.raise_for_status()
+            # Revalidate a previously scraped page instead of downloading it again;
+            # headers are checked before any of the body is read
+            request = client.build_request(
+                "GET", url, headers=cache.conditional_headers(cached) if cached else None
+            )
+            response = await client.send(request, stream=True)
+            try:
+                if response.status_code == 304 and cached:
+                    logger.info(f"Not modified since last scrape: {url}")
+                    await asyncio.to_thread(cache.touch, url)
+                    return {
+                        'title': cached['title'],
+                        'content': cached['content'],
+                        'url': cached['url']
+                    }
+                response.raise_for_status()
+                
+                # Check content type
+                content_type = response.headers.get('content-type', '').lower()
+                if 'text/html' not in content_type:
+                    logger.error(f"Invalid content type: {content_type}")
+                    return None
+                
+                html = await read_page(response, url)
+            finally:
+                await response.aclose()
             
-            # Check content type
-            content_type = response.headers.get('content-type', '').lower()
-            if 'text/html' not in content_type:
-                logger.error(f"Invalid content type: {content_type}")
-                return None
-            
-            # Parse HTML
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Remove unwanted elements
-            remove_unwanted_elements(soup)
-            
-            # Extract title and content
-            title = extract_title(soup)
-            content = extract_content(soup)
+            # Parse HTML in the worker pool
+            title, content = await parser_pool.parse(html)
             
             # Validation
             if not content or len(content) < 100:
@@ -196,17 +282,32 @@ def extract_article_content(url: str, retry_count: int = 2) -> Optional[Dict[str
             
             logger.info(f"Successfully scraped {url}: {len(content)} chars, {len(content.split())} words")
             
+            if cache:
+                await asyncio.to_thread(
+                    cache.set,
+                    url,
+                    response.headers.get('etag'),
+                    response.headers.get('last-modified'),
+                    str(response.url),
+                    title,
+                    content,
+                    revalidated=cached is not None
+                )
+            
             return {
                 'title': title,
                 'content': content,
-                'url': response.url  # Use final URL after redirects
+                'url': str(response.url)  # Use final URL after redirects
             }
             
-        except requests.exceptions.Timeout:
+        except (ParseTimeout, asyncio.TimeoutError):
+            logger.error(f"Parsing {url} took longer than {PARSE_TIMEOUT}s; giving up")
+            break
+        except httpx.TimeoutException:
             logger.error(f"Timeout scraping {url} (attempt {attempt + 1})")
-        except requests.exceptions.ConnectionError:
+        except httpx.TransportError:
             logger.error(f"Connection error scraping {url} (attempt {attempt + 1})")
-        except requests.exceptions.HTTPError as e:
+        except httpx.HTTPStatusError as e:
             logger.error(f"HTTP error {e.response.status_code} scraping {url}")
             if e.response.status_code in [404, 403, 401]:
                 break  # Don't retry for these errors
@@ -71,13 +71,12 @@ def test_api():
     
     try:
         response = requests.post(f"{BASE_URL}/articles", json=article_data, headers=headers)
-        if response.status_code == 200:
+        if response.status_code == 202:
             article = response.json()
             article_id = article["id"]
-            print("✅ Article added successfully")
+            print("✅ Article accepted for ingestion")
             print(f"   ID: {article_id}")
-            print(f"   Title: {article['title'][:50]}...")
-            print(f"   Content length: {len(article['content'])} chars")
+            print(f"   Status: {article['status']}")
         else:
             print(f"❌ Article addition failed: {response.status_code} - {response.text}")
             return
@@ -85,20 +84,93 @@ def test_api():
         print(f"❌ Article addition error: {e}")
         return
     
+    # Wait for the background scrape/embed to finish
+    status_data = {}
+    for _ in range(60):
+        response = requests.get(f"{BASE_URL}/articles/{article_id}/status", headers=headers)
+        status_data = response.json()
+        if status_data["status"] in ("ready", "failed"):
+            break
+        time.sleep(1)
+    
+    if status_data.get("status") == "ready":
+        print("✅ Article ingested successfully")
+    else:
+        print(f"❌ Article ingestion did not finish: {status_data}")
+        return
+    
+    # Test 4b: Bulk import
+    print("\n4b. Testing bulk import...")
+    bulk_data = {
+        "urls": ["https://httpbin.org/html", "https://example.com", "not-a-url"],
+        "tags": "bulk"
+    }
+    
+    try:
+        response = requests.post(f"{BASE_URL}/articles/bulk", json=bulk_data, headers=headers)
+        if response.status_code == 202:
+            results = response.json()
+            print(f"✅ Bulk import accepted {len(results)} URLs")
+            for result in results:
+                print(f"   {result['url']}: {result['status']}")
+        else:
+            print(f"❌ Bulk import failed: {response.status_code} - {response.text}")
+    except Exception as e:
+        print(f"❌ Bulk import error: {e}")
+    
+    # Test 4c: Refresh the article; an unchanged page re-embeds nothing
+    print("\n4c. Testing article refresh...")
+    try:
+        response = requests.post(f"{BASE_URL}/articles/{article_id}/refresh", headers=headers)
+        if response.status_code == 202:
+            for _ in range(60):
+                status_data = requests.get(f"{BASE_URL}/articles/{article_id}/status", headers=headers).json()
+                if status_data["status"] in ("ready", "failed"):
+                    break
+                time.sleep(1)
+            print(f"✅ Article refreshed: {status_data['status']}")
+        else:
+            print(f"❌ Article refresh failed: {response.status_code} - {response.text}")
+    except Exception as e:
+        print(f"❌ Article refresh error: {e}")
+    
     # Test 5: List articles
     print("\n5. Testing article listing...")
     try:
-        response = requests.get(f"{BASE_URL}/articles", headers=headers)
+        response = requests.get(f"{BASE_URL}/articles", params={"limit": 20}, headers=headers)
         if response.status_code == 200:
             articles = response.json()
             print(f"✅ Retrieved {len(articles)} articles")
             if articles:
                 print(f"   First article: {articles[0]['title'][:50]}...")
+            if response.headers.get("X-Next-Cursor"):
+                print("   More articles on the next page")
+            
+            unchanged = requests.get(
+                f"{BASE_URL}/articles",
+                params={"limit": 20},
+                headers={**headers, "If-None-Match": response.headers["ETag"]}
+            )
+            if unchanged.status_code == 304:
+                print("✅ Unchanged listing answered with 304")
+            else:
+                print(f"❌ Expected 304 for an unchanged listing, got {unchanged.status_code}")
         else:
             print(f"❌ Article listing failed: {response.status_code}")
     except Exception as e:
         print(f"❌ Article listing error: {e}")
     
+    # Test 5b: Full article
+    print("\n5b. Testing article detail...")
+    try:
+        response = requests.get(f"{BASE_URL}/articles/{article_id}", headers=headers)
+        if response.status_code == 200:
+            print(f"✅ Article {article_id}: {len(response.json()['content'])} characters of content")
+        else:
+            print(f"❌ Article detail failed: {response.status_code}")
+    except Exception as e:
+        print(f"❌ Article detail error: {e}")
+    
     # Test 6: Search with ChromaDB (semantic search)
     print("\n6. Testing semantic search with ChromaDB...")
     search_data = {
@@ -120,6 +192,20 @@ def test_api():
     except Exception as e:
         print(f"❌ Search error: {e}")
     
+    # Test 6b: Keyword-only search (no embedding call)
+    print("\n6b. Testing keyword search...")
+    try:
+        response = requests.post(f"{BASE_URL}/search", json={**search_data, "mode": "keyword"}, headers=headers)
+        if response.status_code == 200:
+            results = response.json()
+            print(f"✅ Keyword search completed, found {len(results['results'])} results")
+            for i, result in enumerate(results['results'], 1):
+                print(f"   {i}. {result['article']['title'][:30]}... (score: {result['similarity_score']:.3f})")
+        else:
+            print(f"❌ Keyword search failed: {response.status_code} - {response.text}")
+    except Exception as e:
+        print(f"❌ Keyword search error: {e}")
+    
     # Test 7: Q&A 
     print("\n7. Testing Q&A with GPT-4o-mini...")
     qa_data = {
@@ -0,0 +1,110 @@
+import sys
+import os
+import re
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark import load_fixtures, make_document
+from chunking import chunk_spans, estimate_span_tokens, get_token_counter, sentence_spans
+from scraper import parse_article
+
+MAX_TOKENS = 200
+OVERLAP_TOKENS = 40
+
+# Plain statement of what a sentence is, to check the one-pass splitter against
+_SENTENCE_END = re.compile(r'[.!?]+(?=\s)|\n\s*\n')
+
+def reference_sentences(text):
+    spans = []
+    start = 0
+    for end in [match.end() for match in _SENTENCE_END.finditer(text)] + [len(text)]:
+        sentence = text[start:end]
+        if sentence.strip():
+            first = start + len(sentence) - len(sentence.lstrip())
+            spans.append((first, start + len(sentence.rstrip())))
+        start = end
+    return spans
+
+def count_words(text, start, end):
+    """Words never merge across whitespace, so sentence counts add up exactly"""
+    return len(text[start:end].split())
+
+def sample_texts():
+    texts = [(name, parse_article(html)[1]) for name, html in load_fixtures()]
+    texts += [(f"synthetic {words} words", make_document(words, seed=words)) for words in (40, 2000, 50000)]
+    texts += [
+        ("no punctuation", "word " * 1000),
+        ("one long word", "x" * 3000),
+        ("whitespace only", " \n\n "),
+        ("odd spacing", "a.b. c!! d?\n\n e  \n \n f\ng. " * 50),
+    ]
+    return texts
+
+def check_spans(text, spans, count_tokens, exact):
+    """Problems with spans as chunks of text; an empty list when they are fine"""
+    problems = []
+    sentences = sentence_spans(text)
+    starts = {start for start, _ in sentences}
+    ends = {end for _, end in sentences}
+    covered = 0
+    for i, (start, end) in enumerate(spans):
+        if not start < end or text[start].isspace() or text[end - 1].isspace():
+            problems.append(f"chunk {i} is empty or untrimmed")
+        if exact and count_tokens(text, start, end) > MAX_TOKENS:
+            problems.append(f"chunk {i} is over budget ({count_tokens(text, start, end)} tokens)")
+        if text[covered:start].strip():
+            problems.append(f"text before chunk {i} is in no chunk")
+        # Chunks start and end on sentences, unless they hold a piece of one over budget
+        long_sentence = any(s < start < e or s < end < e for s, e in sentences)
+        if not long_sentence and (start not in starts or end not in ends):
+            problems.append(f"chunk {i} doesn't start and end on sentences")
+        if i:
+            previous_start, previous_end = spans[i - 1]
+            if start <= previous_start:
+                problems.append(f"chunk {i} doesn't move forward")
+            elif exact and start < previous_end and count_tokens(text, start, previous_end) > OVERLAP_TOKENS:
+                problems.append(f"chunk {i} overlaps the previous one by more than the overlap budget")
+        covered = max(covered, end)
+    if text[covered:].strip():
+        problems.append("text after the last chunk is in no chunk")
+    return problems
+
+def test_sentence_spans():
+    """The one-pass splitter finds the same sentences as the plain definition"""
+    print("\nTesting sentence splitting...")
+    print("=" * 50)
+
+    failures = [name for name, text in sample_texts() if sentence_spans(text) != reference_sentences(text)]
+    for name in failures:
+        print(f"❌ {name}: sentences differ from the reference splitter")
+    assert not failures, f"sentence splitting differs for: {', '.join(failures)}"
+    print("✅ all samples split alike")
+
+def test_chunk_spans():
+    """Spans are trimmed, within budget, cover the text and overlap by whole sentences"""
+    print("\nTesting chunk spans...")
+    print("=" * 50)
+
+    # The estimate counts the spaces between sentences when measuring a whole
+    # span, so budgets are only checked with counters that add up exactly
+    counters = [("words", count_words, True), ("estimate", estimate_span_tokens, False)]
+    try:
+        counters.append(("tiktoken", get_token_counter(), True))
+    except Exception as e:
+        print(f"(no tokenizer: {e}; checking with word and estimated counts only)")
+
+    failures = []
+    for name, text in sample_texts():
+        for counter_name, counter, exact in counters:
+            spans = chunk_spans(text, MAX_TOKENS, OVERLAP_TOKENS, counter)
+            problems = check_spans(text, spans, counter, exact)
+            if problems:
+                failures.append(f"{name} ({counter_name})")
+                print(f"❌ {name} ({counter_name}): {'; '.join(problems[:3])}")
+            else:
+                print(f"✅ {name} ({counter_name}): {len(spans)} chunks")
+
+    assert not failures, f"chunking problems in: {', '.join(failures)}"
+
+if __name__ == "__main__":
+    test_sentence_spans()
+    test_chunk_spans()
@@ -3,9 +3,20 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from scraper import extract_article_content
+from scraper import extract_article_content, close_client, parse_article, read_page, SCRAPER_MAX_BYTES
+import httpx
+import asyncio
 import time
 
+def scrape(url):
+    """Run one scrape on its own event loop"""
+    async def run():
+        try:
+            return await extract_article_content(url)
+        finally:
+            await close_client()
+    return asyncio.run(run())
+
 def test_scraper():
    
     # Test URLs with different website structures
@@ -23,7 +34,7 @@ def test_scraper():
         print("-" * 30)
         
         try:
-            result = extract_article_content(url)
+            result = scrape(url)
             
             if result:
                 print(f"✅ SUCCESS")
@@ -71,7 +82,7 @@ def test_edge_cases():
                 print("❌ EXPECTED - None input not allowed")
                 continue
                 
-            result = extract_article_content(url)
+            result = scrape(url)
             
             if result is None:
                 print("✅ EXPECTED - Correctly handled invalid input")
@@ -81,6 +92,61 @@ def test_edge_cases():
         except Exception as e:
             print(f"✅ EXPECTED - Error handled: {str(e)}")
 
+def test_fixture_extraction():
+    """The extraction engine must match the legacy one on the saved pages"""
+    from benchmark import legacy_parse_article, load_fixtures
+    
+    print("\nTesting extraction on fixture pages...")
+    print("=" * 50)
+    
+    mismatches = []
+    for name, html in load_fixtures():
+        title, content = parse_article(html)
+        if (title, content) == legacy_parse_article(html):
+            print(f"✅ {name}: {title[:50]} ({len(content)} characters)")
+        else:
+            print(f"❌ {name}: output differs from the legacy extractor")
+            mismatches.append(name)
+    
+    assert not mismatches, f"Extraction changed for: {', '.join(mismatches)}"
+
+class ChunkedStream(httpx.AsyncByteStream):
+    """Serve a page in 64 KB pieces, counting how much of it was read"""
+    def __init__(self, data):
+        self.data = data
+        self.sent = 0
+    
+    async def __aiter__(self):
+        for i in range(0, len(self.data), 65536):
+            self.sent += len(self.data[i:i + 65536])
+            yield self.data[i:i + 65536]
+
+def test_streamed_read():
+    """Large pages are read only up to their main content, and never past the cap"""
+    from benchmark import load_fixtures, make_large_page
+    
+    print("\nTesting streamed page reads...")
+    print("=" * 50)
+    
+    html = dict(load_fixtures())["blog.html"]
+    large = make_large_page(html, 3000)
+    
+    async def read(data):
+        stream = ChunkedStream(data)
+        body = await read_page(httpx.Response(200, stream=stream), "http://test/page")
+        return body, stream.sent
+    
+    body, sent = asyncio.run(read(html))
+    assert body == html
+    print(f"✅ small page read whole ({len(body)} bytes)")
+    
+    body, sent = asyncio.run(read(large))
+    assert sent < len(large) and len(body) <= SCRAPER_MAX_BYTES
+    assert parse_article(body) == parse_article(html)
+    print(f"✅ {len(large)} byte page stopped after {sent} bytes with the same extraction")
+
 if __name__ == "__main__":
     test_scraper()
     test_edge_cases()
+    test_fixture_extraction()
+    test_streamed_read()